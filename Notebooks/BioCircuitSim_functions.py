@@ -1,13 +1,14 @@
 import random
-import matplotlib.pyplot as plt
 import numpy as np
-from typing import Tuple
-from pydna.amplify import pcr
-from pydna.dseqrecord import Dseqrecord
+from typing import Tuple, TYPE_CHECKING
 import random
 import time
 import warnings
 
+# pydna and matplotlib are imported where they are used, which keeps importing this module cheap
+if TYPE_CHECKING:
+    from pydna.dseqrecord import Dseqrecord
+
 def random_sequence_generator(length:int) -> str:
    nucleotides = ['A', 'T', 'C', 'G']
    return ''.join(random.choice(nucleotides) for i in range(length))
@@ -32,7 +33,10 @@ def get_putida_genome(promoter:str, regulator:str) -> str:
     putida_genome += random_sequence_generator(random.randint(0, 1000))
     return putida_genome
 
-def perform_pcr(forward_primer, reverse_primer, genome:str) -> Tuple[Dseqrecord, bool]:
+def perform_pcr(forward_primer, reverse_primer, genome:str) -> Tuple['Dseqrecord', bool]:
+    from pydna.amplify import pcr
+    from pydna.dseqrecord import Dseqrecord
+
     #set new seed based on the time
     t = 1e3 * time.time()
     random.seed(int(t) % 2**32)
@@ -48,6 +52,8 @@ def perform_pcr(forward_primer, reverse_primer, genome:str) -> Tuple[Dseqrecord,
         return primer, False
 
 def perform_batch_experiment(mutant, pcr_product:Tuple):
+    import matplotlib.pyplot as plt
+
     time = np.arange(0, 10)
     #PCR failes
     if not pcr_product[1]:
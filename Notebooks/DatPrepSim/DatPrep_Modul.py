@@ -1,13 +1,478 @@
-import matplotlib.pyplot
-import matplotlib.pyplot as plt
+# matplotlib is only imported inside the plotting methods, so generating datasets does not pay for it
+import hashlib
+import json
+import os
+import pickle
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
 from random import uniform, randint, choice, seed
-import matplotlib
 DEBUG = False
 if DEBUG:
+    import matplotlib
     matplotlib.use("tkAgg")
-print(matplotlib.get_backend())
+    print(matplotlib.get_backend())
+
+# Parameters estimated by fit_monod_batch() and their bounds (lower, upper), the starting conditions S0 and X0 are
+# fitted as well because the first measurement may be corrupted
+BATCH_FIT_PARAMETERS = ('umax', 'Ks', 'Yx', 'k1', 'S0', 'X0')
+BATCH_FIT_BOUNDS = ([0.5, 7, 0.4, 0.05, 15, 0.01], [1.1, 10, 0.6, 0.2, 25, 0.5])
+
+# Ranges (low, high) from which MonodModel draws its parameters and starting conditions
+PARAM_RANGES = {'umax': (0.5, 1.1), 'Ks': (7, 10), 'Yx': (0.4, 0.6), 'k1': (0.05, 0.2),
+                'S0': (19, 21), 'X0': (0.05, 0.3)}
+RESULT_VARIABLES = ('X', 'S', 'P', 'u')
+# Process duration [h] of MonodModel, i.e. the number of time points of every curve
+DURATION = 24
+
+# Directory of the on-disk cache of the default datasets, the cache is opt-in: None unless the environment variable
+# BIOLABSIM_CACHE names a directory. Bump CACHE_VERSION whenever the generation of the default datasets changes
+DEFAULT_CACHE_DIR = os.environ.get('BIOLABSIM_CACHE') or None
+CACHE_VERSION = 3
+# Number of curves that share one random stream in the array-backed generation, independent of the number of workers
+ARRAY_BLOCK_SIZE = 4096
+# First entry of the spawn_key of all random streams derived from one random_seed: custom datasets use 0, the default
+# datasets their number (1, 2, 3) and streamed exports EXPORT_STREAM, so their curves are independent of each other
+EXPORT_STREAM = 4
+# Kinds of errors in the masks of add_random_errors_batch() and the file layout version of export_dataset()
+MASK_KINDS = ('noise', 'outliers', 'missing')
+EXPORT_VERSION = 1
+# Row type of the parameter table of an array-backed Datensatz
+PARAM_TABLE_DTYPE = np.dtype([(name, float) for name in BATCH_FIT_PARAMETERS]
+                             + [(flag, bool) for flag in ('apply_noise', 'apply_outliers', 'apply_missing_values')])
+
+
+def calculate_monod_batch(umax, Ks, Yx, k1, S0, X0, P0=0, duration=DURATION, u0=0):
+    """
+    Calculates the Monod kinetics of MonodModel.calculate_monod() (without errors) for many parameter sets at once.
+    Parameters are scalars or arrays with one entry per curve, the results equal the per-model loop exactly.
+
+    :return: np.ndarray of shape (n_curves, 4, duration) with X, S, P and u
+    """
+    umax, Ks, Yx, k1, S0, X0, P0, u0 = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (umax, Ks, Yx, k1, S0, X0, P0, u0)))
+    X, S, P, u = (np.empty((duration, len(umax))) for _ in range(4))
+    X[0], S[0], P[0], u[0] = X0, S0, P0, u0
+
+    for j in range(1, duration):
+        u[j] = np.maximum(umax * S[j - 1] / (Ks + S[j - 1]), 0)  # Change of µ
+        new_rX = u[j - 1] * X[j - 1]  # Derivative of Biomass
+        X[j] = X[j - 1] + new_rX
+        S[j] = np.maximum(S[j - 1] - new_rX / Yx, 0)
+        P[j] = P[j - 1] + (k1 * u[j]) * X[j]
+
+    return np.stack([X, S, P, u], axis=1).transpose(2, 1, 0)
+
+
+def fit_monod_batch(data, loss='soft_l1', f_scale=0.05, max_iter=100, ftol=1e-6, xtol=1e-6, x0=None):
+    """
+    Fits umax, Ks, Yx, k1 and the starting conditions S0 and X0 (BATCH_FIT_PARAMETERS, within BATCH_FIT_BOUNDS) to
+    many measured curves at once with a robust Levenberg-Marquardt method. All curves are simulated together with
+    calculate_monod_batch(), the Jacobian by forward differences takes one further call for all curves and
+    parameters. Parameters at a bound are held there while the gradient points outwards. Residuals are scaled per
+    variable by the mean absolute measurement, a robust loss ('soft_l1', 'huber' or 'linear' for least squares)
+    down-weights residuals larger than f_scale (iteratively reweighted), so single outliers hardly move the fit.
+    NaN values are ignored. The optima agree with scipy.optimize.least_squares with the same loss and scaling.
+    Raises ValueError for unknown losses.
+
+    :param data: np.ndarray of shape (n_curves, 3, duration) with measured X, S, P
+    :param loss: str, 'soft_l1', 'huber' or 'linear'
+    :param f_scale: float, scaled residual at which the robust loss starts to flatten
+    :param max_iter: int, maximum number of iterations per curve
+    :param ftol: float, stop when an accepted step reduces the cost by less than this fraction
+    :param xtol: float, stop when the step is smaller than this fraction of the bounds
+    :param x0: np.ndarray of shape (n_curves, 6), starting values, default the centre of BATCH_FIT_BOUNDS
+    :return: dict, 'params' of shape (n_curves, 6), 'cost' (robust cost), 'iterations' and 'converged' per curve
+    """
+    if loss not in ('soft_l1', 'huber', 'linear'):
+        raise ValueError(f'Unknown loss "{loss}". Choose "soft_l1", "huber" or "linear".')
+    data = np.asarray(data, dtype=float)
+    n_curves, _, duration = data.shape
+    low, high = np.array(BATCH_FIT_BOUNDS[0]), np.array(BATCH_FIT_BOUNDS[1])
+    n_params = len(low)
+    valid = ~np.isnan(data)
+    scale = np.nanmean(np.abs(data), axis=(0, 2))[:, None]  # the median is 0 for substrate that is used up
+    scale = np.where(scale > 0, scale, 1)
+    measured = np.where(valid, data, 0) / scale
+
+    def residuals(theta, rows):
+        simulated = calculate_monod_batch(*theta.T, duration=duration)[:, :3] / scale
+        return np.where(valid[rows], simulated - measured[rows], 0).reshape(len(rows), -1)
+
+    def rho(r):
+        # robust loss and its derivative with respect to z = (r / f_scale) ** 2
+        z = (r / f_scale) ** 2
+        if loss == 'soft_l1':
+            return 2 * (np.sqrt(1 + z) - 1), 1 / np.sqrt(1 + z)
+        if loss == 'huber':
+            return np.where(z <= 1, z, 2 * np.sqrt(z) - 1), np.where(z <= 1, 1, 1 / np.sqrt(np.maximum(z, 1)))
+        return z, np.ones_like(z)
+
+    def cost(r):
+        return 0.5 * f_scale ** 2 * rho(r)[0].sum(axis=1)
+
+    theta = np.broadcast_to((low + high) / 2 if x0 is None else np.asarray(x0, dtype=float), (n_curves, n_params))
+    theta = np.clip(theta, low, high)
+    r = residuals(theta, np.arange(n_curves))
+    f = cost(r)
+    damping = np.full(n_curves, 1e-3)
+    iterations = np.zeros(n_curves, dtype=int)
+    converged = np.zeros(n_curves, dtype=bool)
+    active = np.ones(n_curves, dtype=bool)
+    h = 1e-7 * (high - low)
+
+    for _ in range(max_iter):
+        rows = np.flatnonzero(active)
+        if not len(rows):
+            break
+        # forward differences for all active curves and parameters in one simulation
+        shifted = theta[rows][:, None, :] + np.diag(h)[None]
+        J = (residuals(shifted.reshape(-1, n_params), np.repeat(rows, n_params)).reshape(len(rows), n_params, -1)
+             - r[rows][:, None, :]) / h[None, :, None]
+        weight = rho(r[rows])[1]
+        H = np.einsum('npr,nr,nqr->npq', J, weight, J)
+        g = np.einsum('npr,nr->np', J, weight * r[rows])
+        # parameters at a bound that the gradient pushes outwards stay fixed, clipping their steps would stall the fit
+        fixed = ((theta[rows] <= low) & (g > 0)) | ((theta[rows] >= high) & (g < 0))
+        H = np.where(fixed[:, :, None] | fixed[:, None, :], 0, H)
+        g = np.where(fixed, 0, g)
+        diagonal = np.where(fixed, 1, np.diagonal(H, axis1=1, axis2=2))
+        A = H + (damping[rows, None] * diagonal + 1e-12)[:, :, None] * np.eye(n_params)
+        trial = np.clip(theta[rows] - np.linalg.solve(A, g[..., None])[..., 0], low, high)
+        r_trial = residuals(trial, rows)
+        f_trial = cost(r_trial)
+
+        better = f_trial < f[rows]
+        accepted = rows[better]
+        decrease = (f[accepted] - f_trial[better]) / np.maximum(f[accepted], 1e-300)
+        step = np.max(np.abs(trial - theta[rows]) / (high - low), axis=1)
+        theta[accepted], r[accepted], f[accepted] = trial[better], r_trial[better], f_trial[better]
+        damping[rows] = np.where(better, damping[rows] / 10, damping[rows] * 10)
+        iterations[rows] += 1
+
+        done = step < xtol
+        done[better] |= decrease < ftol
+        converged[rows[done]] = True
+        active[rows[done | (damping[rows] > 1e12)]] = False
+
+    return {'params': theta, 'cost': f, 'iterations': iterations, 'converged': converged}
+
+
+def draw_parameter_table(n, rng, noise=False, outliers=False, missing=False):
+    """
+    Draws the parameters and starting conditions of n models at once, from the same ranges (PARAM_RANGES) and with
+    the same rounding as MonodModel.
+
+    :param n: int, number of models
+    :param rng: np.random.Generator
+    :param noise, outliers, missing: bool or boolean array of length n, error flags stored with the parameters
+    :return: structured np.ndarray of length n with PARAM_TABLE_DTYPE
+    """
+    table = np.zeros(n, dtype=PARAM_TABLE_DTYPE)
+    for name in BATCH_FIT_PARAMETERS:
+        table[name] = np.round(rng.uniform(*PARAM_RANGES[name], size=n), 3)
+    table['apply_noise'], table['apply_outliers'], table['apply_missing_values'] = noise, outliers, missing
+    return table
+
+
+def _draw(rng, rows, method, *args, size=()):
+    """
+    Draws rng.method(*args) for every row in rows, from one Generator at once or from the row's own Generator.
+
+    :return: np.ndarray of shape (len(rows), *size)
+    """
+    if isinstance(rng, np.random.Generator):
+        return getattr(rng, method)(*args, size=(len(rows),) + size)
+    if not len(rows):  # the empty result only needs the dtype of the method, no generator state is used
+        return getattr(np.random.default_rng(0), method)(*args, size=(0,) + size)
+    return np.array([getattr(rng[row], method)(*args, size=size) for row in rows]).reshape((len(rows),) + size)
+
+
+def add_random_errors_batch(data, noise=True, outliers=True, missing=True, rng=None,
+                            noise_level_X=0.05, noise_level_S=0.05, noise_level_P=0.1,
+                            outliers_X=1, outliers_S=1, outliers_P=1,
+                            missing_X=1, missing_S=1, missing_P=1, multiplier_range=(2.5, 5.0), copy=True):
+    """
+    Adds the errors of MonodModel.add_random_errors() to a whole block of curves at once and returns where they were
+    put. Noise is relative to the standard deviation of each curve, outliers are scaled by +-multiplier_range and
+    missing values are set to NaN, each per variable X, S and P (the first three variables of data, further variables
+    like u stay untouched) in the order noise, outliers, missing values. Repeated outlier positions are scaled twice,
+    like in MonodModel. Raises ValueError if data is not of shape (n_curves, >= 3, duration) or if the number of
+    generators does not match.
+
+    :param data: np.ndarray of shape (n_curves, n_variables, duration), e.g. from calculate_monod_batch()
+    :param noise, outliers, missing: bool or boolean array of length n_curves, which curves get which error
+    :param rng: np.random.Generator for all curves or a sequence with one Generator per curve, default a new Generator
+    :param noise_level_X/S/P: float, standard deviation of the noise relative to the one of the curve
+    :param outliers_X/S/P: int, number of outliers per curve
+    :param missing_X/S/P: int, number of missing values per curve
+    :param multiplier_range: tuple, range of the outlier factor
+    :param copy: bool, if False data is changed in place
+    :return: tuple of the data with errors and a dict of boolean masks of the shape of data with the keys 'noise',
+             'outliers' and 'missing'
+    """
+    data = np.array(data, dtype=float) if copy else np.asarray(data, dtype=float)
+    if data.ndim != 3 or data.shape[1] < 3:
+        raise ValueError(f'Expected data of shape (n_curves, >= 3, duration), got {data.shape}.')
+    n, _, duration = data.shape
+    rng = np.random.default_rng() if rng is None else rng
+    if not isinstance(rng, np.random.Generator) and len(rng) != n:
+        raise ValueError(f'Expected one generator per curve ({n}), got {len(rng)}.')
+    flags = {name: np.broadcast_to(np.asarray(flag, dtype=bool), n)
+             for name, flag in (('noise', noise), ('outliers', outliers), ('missing', missing))}
+    masks = {name: np.zeros(data.shape, dtype=bool) for name in flags}
+
+    rows = np.flatnonzero(flags['noise'])
+    for var, level in enumerate((noise_level_X, noise_level_S, noise_level_P)):
+        block = data[rows, var]
+        noise = _draw(rng, rows, 'normal', 0, 1, size=(duration,)) * (level * block.std(axis=1, keepdims=True))
+        data[rows, var] = np.maximum(block + noise, 0)
+        masks['noise'][rows, var] = True
+
+    rows = np.flatnonzero(flags['outliers'])
+    for var, count in enumerate((outliers_X, outliers_S, outliers_P)):
+        idx = _draw(rng, rows, 'integers', 0, duration, size=(count,))
+        multiplier = (_draw(rng, rows, 'uniform', *multiplier_range, size=(count,))
+                      * _draw(rng, rows, 'choice', [-1, 1], size=(count,)))
+        np.multiply.at(data, (rows[:, None], var, idx), multiplier)  # repeated positions are scaled twice
+        masks['outliers'][rows[:, None], var, idx] = True
+
+    rows = np.flatnonzero(flags['missing'])
+    for var, count in enumerate((missing_X, missing_S, missing_P)):
+        idx = _draw(rng, rows, 'integers', 0, duration, size=(count,))
+        data[rows[:, None], var, idx] = np.nan
+        masks['missing'][rows[:, None], var, idx] = True
+
+    return data, masks
+
+
+class _GlobalRandom:
+    """
+    Generator-like access to the global random and np.random state, used by MonodModel if no generator is given.
+    """
+
+    @staticmethod
+    def uniform(low, high):
+        return uniform(low, high)
+
+    @staticmethod
+    def integers(low, high):
+        return randint(low, high - 1)
+
+    @staticmethod
+    def choice(options):
+        return choice(options)
+
+    @staticmethod
+    def normal(loc, scale, size):
+        return np.random.normal(loc, scale, size)
+
+
+def _generate_model(task):
+    """
+    Creates and calculates one MonodModel of a Datensatz from its error option and seed stream (process pool task).
+    """
+    errors, stream = task
+    model = MonodModel(
+        add_errors='none' not in errors,
+        apply_noise='noise' in errors,
+        apply_outliers='outliers' in errors,
+        apply_missing_values='missing' in errors,
+        rng=np.random.default_rng(stream)
+    )
+    model.calculate_monod()
+    return model
+
+
+def _generate_block(task):
+    """
+    Draws, simulates and corrupts one block of an array-backed Datensatz from its error options and seed stream
+    (process pool task).
+
+    :return: tuple of the parameter table, the data and the error masks of the block
+    """
+    errors, stream = task
+    rng = np.random.default_rng(stream)
+    params = draw_parameter_table(len(errors), rng,
+                                  noise=['noise' in e for e in errors],
+                                  outliers=['outliers' in e for e in errors],
+                                  missing=['missing' in e for e in errors])
+    data = calculate_monod_batch(*(params[name] for name in BATCH_FIT_PARAMETERS))
+    data, masks = add_random_errors_batch(data, params['apply_noise'], params['apply_outliers'],
+                                          params['apply_missing_values'], rng=rng, copy=False)
+    return params, data, masks
+
+
+def _map(function, tasks, n_workers):
+    """
+    Maps function over tasks, in a process pool if n_workers > 1. The results keep the order of the tasks.
+    """
+    if n_workers <= 1 or len(tasks) <= 1:
+        return list(map(function, tasks))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(function, tasks, chunksize=max(1, len(tasks) // (4 * n_workers))))
+
+
+def _imap_bounded(function, tasks, n_workers):
+    """
+    Lazily maps function over the iterable tasks, in a process pool if n_workers > 1. At most 2 * n_workers results
+    are pending at any time, so memory stays bounded if the caller consumes the results one by one.
+    """
+    if n_workers <= 1:
+        yield from map(function, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(function, task))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def count_error_options(error_distribution, n):
+    """
+    Lists the error options of n curves (unshuffled) for a percentage distribution like
+    Datensatz._default_error_distribution(), curves left over by rounding get no errors.
+    Raises ValueError if the percentages do not sum up to 100.
+
+    :return: list of lists of error names, e.g. ['noise', 'outliers']
+    """
+    if sum(error_distribution.values()) != 100:
+        raise ValueError("Die Summe der prozentualen Verteilung muss 100 ergeben.")
+    options = []
+    for error_option, percentage in error_distribution.items():
+        options.extend([error_option.split(',')] * int((percentage / 100) * n))
+    options.extend([['none']] * (n - len(options)))
+    return options
+
+
+def _generate_chunk(task):
+    """
+    Generates chunk index of a streamed dataset (process pool task). The chunk draws its error options and curves from
+    its own stream SeedSequence(random_seed, spawn_key=(EXPORT_STREAM, index)), i.e. the stream index spawned from
+    SeedSequence(random_seed, spawn_key=(EXPORT_STREAM,)), created without spawning all earlier streams.
+
+    :return: tuple of the parameter table, the data and the error masks of the chunk
+    """
+    random_seed, index, n_curves, error_distribution = task
+    options_stream, block_stream = np.random.SeedSequence(random_seed, spawn_key=(EXPORT_STREAM, index)).spawn(2)
+    errors = count_error_options(error_distribution, n_curves)
+    np.random.default_rng(options_stream).shuffle(errors)
+    return _generate_block((errors, block_stream))
+
+
+def iter_dataset_chunks(n_curves, random_seed, error_distribution, chunk_size=ARRAY_BLOCK_SIZE, n_workers=1):
+    """
+    Generates an array-backed dataset chunk by chunk, only about 2 * n_workers chunks are held in memory at once.
+    Each chunk has the error distribution on its own and its own random stream, so the output depends on
+    random_seed, error_distribution and chunk_size only (not on n_workers).
+
+    :param n_curves: int, total number of curves
+    :param random_seed: int, seed of all streams
+    :param error_distribution: dict, percentage per error option, see Datensatz._default_error_distribution()
+    :param chunk_size: int, number of curves per chunk
+    :param n_workers: int, number of processes
+    :return: generator of tuples (offset, params, data, masks) with the index of the first curve of the chunk, its
+             parameter table, data of shape (n, 4, duration) and error masks (see add_random_errors_batch())
+    """
+    count_error_options(error_distribution, 0)  # fail before any work is done
+    sizes = [min(chunk_size, n_curves - offset) for offset in range(0, n_curves, chunk_size)]
+    tasks = ((random_seed, index, size, error_distribution) for index, size in enumerate(sizes))
+    for index, (params, data, masks) in enumerate(_imap_bounded(_generate_chunk, tasks, n_workers)):
+        yield index * chunk_size, params, data, masks
+
+
+def _chunk_table(offset, params, data, masks):
+    """
+    Flattens one chunk into a wide pd.DataFrame with one row per curve: id, parameter table, values ('X_0', ...)
+    and error masks ('noise_X_0', ...).
+    """
+    import pandas as pd
+
+    n, n_variables, duration = data.shape
+    columns = {'id': np.arange(offset, offset + n)}
+    columns.update({name: params[name] for name in params.dtype.names})
+    for v, variable in enumerate(RESULT_VARIABLES[:n_variables]):
+        columns.update({f'{variable}_{t}': data[:, v, t] for t in range(duration)})
+    for kind in MASK_KINDS:
+        for v, variable in enumerate(RESULT_VARIABLES[:n_variables]):
+            columns.update({f'{kind}_{variable}_{t}': masks[kind][:, v, t] for t in range(duration)})
+    return pd.DataFrame(columns)
+
+
+def export_dataset(directory, n_curves, random_seed, error_distribution, chunk_size=ARRAY_BLOCK_SIZE,
+                   file_format='npy', n_workers=1):
+    """
+    Streams a synthetic dataset of n_curves into directory, one shard per chunk of iter_dataset_chunks(), so memory use
+    does not grow with n_curves. With file_format='npy' each shard consists of shard_<i>_params.npy (parameter table),
+    shard_<i>_data.npy (n, 4, duration) and shard_<i>_masks.npy (n, 3 MASK_KINDS, 4, duration), all readable with
+    np.load(..., mmap_mode='r') (see load_shard()). With 'parquet' each shard is one wide table (needs pyarrow or
+    fastparquet). manifest.json records seed, error distribution, chunk size and the offset and files of every shard,
+    it is written last, so an export without manifest is incomplete.
+    Raises ValueError for unknown file formats.
+
+    :return: dict, the manifest
+    """
+    if file_format not in ('npy', 'parquet'):
+        raise ValueError(f'Unknown file format "{file_format}". Choose "npy" or "parquet".')
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    duration = DURATION
+    for index, (offset, params, data, masks) in enumerate(
+            iter_dataset_chunks(n_curves, random_seed, error_distribution, chunk_size, n_workers)):
+        duration = data.shape[2]
+        if file_format == 'npy':
+            files = {name: f'shard_{index:05d}_{name}.npy' for name in ('params', 'data', 'masks')}
+            np.save(os.path.join(directory, files['params']), params)
+            np.save(os.path.join(directory, files['data']), data)
+            np.save(os.path.join(directory, files['masks']), np.stack([masks[kind] for kind in MASK_KINDS], axis=1))
+        else:
+            files = {'table': f'shard_{index:05d}.parquet'}
+            _chunk_table(offset, params, data, masks).to_parquet(os.path.join(directory, files['table']), index=False)
+        shards.append({'index': index, 'offset': offset, 'n_curves': len(data), 'files': files})
+
+    manifest = {'version': EXPORT_VERSION, 'format': file_format, 'random_seed': random_seed,
+                'error_distribution': error_distribution, 'chunk_size': chunk_size, 'n_curves': n_curves,
+                'duration': duration, 'variables': list(RESULT_VARIABLES), 'parameters': list(PARAM_TABLE_DTYPE.names),
+                'mask_kinds': list(MASK_KINDS), 'shards': shards}
+    temporary = os.path.join(directory, f'manifest.json.{os.getpid()}.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(manifest, file, indent=4)
+    os.replace(temporary, os.path.join(directory, 'manifest.json'))
+    return manifest
+
+
+def load_manifest(directory):
+    """
+    Reads the manifest.json written by export_dataset().
+
+    :return: dict
+    """
+    with open(os.path.join(directory, 'manifest.json')) as file:
+        return json.load(file)
+
+
+def load_shard(directory, index, mmap_mode='r'):
+    """
+    Loads one shard written by export_dataset(). Shards in .npy format are memory-mapped by default.
+
+    :param directory: str, export directory
+    :param index: int, shard index (see the 'shards' of the manifest)
+    :param mmap_mode: str or None, passed to np.load, None reads the shard into memory
+    :return: tuple (params, data, masks) with masks as dict of MASK_KINDS for 'npy', pd.DataFrame for 'parquet'
+    """
+    manifest = load_manifest(directory)
+    files = manifest['shards'][index]['files']
+    if manifest['format'] == 'parquet':
+        import pandas as pd
+
+        return pd.read_parquet(os.path.join(directory, files['table']))
+    params, data, masks = (np.load(os.path.join(directory, files[name]), mmap_mode=mmap_mode)
+                           for name in ('params', 'data', 'masks'))
+    return params, data, {kind: masks[:, k] for k, kind in enumerate(manifest['mask_kinds'])}
 
 
 class MonodModel:
@@ -16,22 +481,25 @@ class MonodModel:
     It now also includes options to introduce different types of random errors to simulate real-world experimental conditions.
     """
 
-    def __init__(self, add_errors=False, apply_noise=False, apply_outliers=False, apply_missing_values=False):
+    def __init__(self, add_errors=False, apply_noise=False, apply_outliers=False, apply_missing_values=False,
+                 rng=None):
         # Instance attributes
+        # np.random.Generator for parameters and errors, default is the global random and np.random state
+        self.__rng = _GlobalRandom() if rng is None else rng
         self.__Organism = 'E. coli'
         self.__OperationMode = 'batch'
         self.__Params = {
             'u0': 0,  # Initial growth rate [h^-1]
-            'umax': round(uniform(0.5, 1.1), 3),  # Maximal growth rate [h^-1] (default 0.5 - 1.1)
-            'duration': 24,  # Process Duration [h]
-            'Ks': round(uniform(7, 10), 3),  # Monod substrate affinity constant (default 7 - 10) [g/L]
-            'Yx': round(uniform(0.4, 0.6), 3),  # Yield coefficient for growth on glucose (default 0.4 - 0.6) [g/g]
-            'k1': round(uniform(0.05, 0.2), 3),  # Production rate of Product (default 0.05 - 0.2) [# h^-1]
+            'umax': round(self.__rng.uniform(*PARAM_RANGES['umax']), 3),  # Maximal growth rate (0.5 - 1.1) [h^-1]
+            'duration': DURATION,  # Process Duration [h]
+            'Ks': round(self.__rng.uniform(*PARAM_RANGES['Ks']), 3),  # Monod substrate affinity constant (7 - 10) [g/L]
+            'Yx': round(self.__rng.uniform(*PARAM_RANGES['Yx']), 3),  # Yield coefficient on glucose (0.4 - 0.6) [g/g]
+            'k1': round(self.__rng.uniform(*PARAM_RANGES['k1']), 3),  # Production rate of Product (0.05 - 0.2) [h^-1]
         }
         self.__Conditions = {
-            'S0': round(uniform(19, 21), 3),  # Initial substrate concentration [g/L]
+            'S0': round(self.__rng.uniform(*PARAM_RANGES['S0']), 3),  # Initial substrate concentration [g/L]
             'P0': 0,  # Initial product concentration [g/L]
-            'X0': round(uniform(0.05, 0.3), 3)  # Initial biomass concentration [g/L]
+            'X0': round(self.__rng.uniform(*PARAM_RANGES['X0']), 3)  # Initial biomass concentration [g/L]
         }
         self.Results = {}
         self.add_errors = add_errors  # Flag to add errors
@@ -40,6 +508,16 @@ class MonodModel:
         self.apply_outliers = apply_outliers
         self.apply_missing_values = apply_missing_values
 
+    def get_params(self):
+        """
+        Returns the true kinetic parameters and starting conditions of the model.
+
+        :return: dict with umax, Ks, Yx, k1, S0, X0
+        """
+        params = {name: self.__Params[name] for name in BATCH_FIT_PARAMETERS[:4]}
+        params.update(S0=self.__Conditions['S0'], X0=self.__Conditions['X0'])
+        return params
+
     def calculate_monod(self):
         """
         Calculates Monod kinetics for current model instance and introduces errors if specified.
@@ -82,21 +560,21 @@ class MonodModel:
 
         # Add random noise to Biomass, Substrate, and Product concentrations
         def add_noise(data, noise_level):
-            noise = np.random.normal(0, noise_level * np.std(data), len(data))
+            noise = self.__rng.normal(0, noise_level * np.std(data), len(data))
             return [max(val + n, 0) for val, n in zip(data, noise)]
 
         # Add random outliers (less extreme)
         def add_outliers(data, n_outliers=1, multiplier_range=(2.5, 5.0)):
             for _ in range(n_outliers):
-                idx = randint(0, len(data) - 1)
-                multiplier = uniform(*multiplier_range)
-                data[idx] *= multiplier * choice([-1, 1])
+                idx = self.__rng.integers(0, len(data))
+                multiplier = self.__rng.uniform(*multiplier_range)
+                data[idx] *= multiplier * self.__rng.choice([-1, 1])
             return data
 
         # Add missing values
         def add_missing_values(data, n_missing=1):
             for _ in range(n_missing):
-                idx = randint(0, len(data) - 1)
+                idx = self.__rng.integers(0, len(data))
                 data[idx] = np.nan
             return data
 
@@ -123,6 +601,7 @@ class MonodModel:
         """
         if not hasattr(self, 'Results'):
             raise AttributeError('No Results yet! Call MonodModel.calculate_monod() before plotting.')
+        import matplotlib.pyplot as plt
 
         time = range(1, self.__Params['duration'] + 1)
         X, S, P = self.Results['X'], self.Results['S'], self.Results['P']
@@ -137,11 +616,83 @@ class MonodModel:
         plt.show()
 
 
-import matplotlib.pyplot as plt
+class MonodView:
+    """
+    Lightweight view on one curve of an array-backed Datensatz. Results and parameters are read from the arrays of the
+    Datensatz without copying, so creating a view costs next to nothing.
+    """
+    __slots__ = ('_data', '_params')
+
+    def __init__(self, data, params):
+        self._data = data  # np.ndarray of shape (4, duration), view into Datensatz.data
+        self._params = params  # row of Datensatz.params
+
+    @property
+    def Results(self):
+        return dict(zip(RESULT_VARIABLES, self._data))
+
+    @property
+    def apply_noise(self):
+        return bool(self._params['apply_noise'])
+
+    @property
+    def apply_outliers(self):
+        return bool(self._params['apply_outliers'])
+
+    @property
+    def apply_missing_values(self):
+        return bool(self._params['apply_missing_values'])
+
+    @property
+    def add_errors(self):
+        return self.apply_noise or self.apply_outliers or self.apply_missing_values
+
+    def get_params(self):
+        """
+        Returns the true kinetic parameters and starting conditions of the curve.
+
+        :return: dict with umax, Ks, Yx, k1, S0, X0
+        """
+        return {name: float(self._params[name]) for name in BATCH_FIT_PARAMETERS}
+
+    def plot_results(self):
+        """
+        Returns plot of the curve (X, S, P vs. Time).
+        """
+        import matplotlib.pyplot as plt
+
+        X, S, P, _ = self._data
+        time = range(1, len(X) + 1)
+        plt.plot(time, X, 'r', label='Biomass [g/L]')
+        plt.plot(time, S, 'g', label='Substrate [g/L]')
+        plt.plot(time, P, 'b', label='Product [g/L]')
+        plt.legend()
+        plt.ylabel('Concentration [g/L]')
+        plt.xlabel('Process Duration [h]')
+        plt.title(f'Monod Model Simulation with{" no" if not self.add_errors else ""} Errors')
+        plt.show()
+
+
 import numpy as np
 import random
 
 
+def _default_dataset_property(number):
+    """
+    Property für Standard-Datensatz number, der erst beim ersten Zugriff erstellt wird (bzw. aus dem Cache geladen).
+    Ohne generate_defaults=True wird None zurückgegeben, solange er nicht explizit erstellt oder gesetzt wurde.
+    """
+    def getter(self):
+        if number not in self._default_datasets and self.generate_defaults:
+            getattr(self, f'create_default_dataset_{number}')()
+        return self._default_datasets.get(number)
+
+    def setter(self, dataset):
+        self._default_datasets[number] = dataset
+
+    return property(getter, setter, doc=f'Standard-Datensatz {number}, siehe create_default_dataset_{number}().')
+
+
 class Datensatz:
     """
     Die 'Datensatz' Klasse verwaltet mehrere Instanzen der MonodModel Klasse, um mehrere Datensätze zu generieren und zu verwalten.
@@ -149,21 +700,44 @@ class Datensatz:
     Festlegung von Fehlerverteilungen und bietet die Möglichkeit, vordefinierte Standarddatensätze zu generieren.
     """
 
-    def __init__(self, n_datasets=10, random_seed=None, generate_custom_datasets=False, generate_defaults=True):
+    default_dataset_1 = _default_dataset_property(1)
+    default_dataset_2 = _default_dataset_property(2)
+    default_dataset_3 = _default_dataset_property(3)
+
+    def __init__(self, n_datasets=10, random_seed=None, generate_custom_datasets=False, generate_defaults=True,
+                 array_backed=False, cache_dir=DEFAULT_CACHE_DIR, n_workers=1):
         """
         Initialisiert die Datensatz-Klasse.
 
         :param n_datasets: Anzahl der zu generierenden Datensätze (nur wenn generate_custom_datasets=True).
         :param random_seed: Zufallssamen für die Reproduzierbarkeit.
         :param generate_custom_datasets: Boolean, ob benutzerdefinierte Datensätze generiert werden sollen.
-        :param generate_defaults: Boolean, ob Standard-Datensätze generiert werden sollen.
+        :param generate_defaults: Boolean, ob Standard-Datensätze generiert werden sollen. Sie werden erst beim ersten
+                                  Zugriff auf default_dataset_1/2/3 erstellt.
+        :param array_backed: Boolean, ob die benutzerdefinierten Datensätze statt als MonodModel-Instanzen in einem
+                             gemeinsamen Array (data) mit Parametertabelle (params) gespeichert werden. Alle Verläufe
+                             werden dann in einem vektorisierten Durchlauf berechnet.
+        :param cache_dir: Verzeichnis, in dem die Standard-Datensätze je Zufallssamen und Fehlerverteilung
+                          zwischengespeichert werden. Standard ist die Umgebungsvariable BIOLABSIM_CACHE, ist sie
+                          nicht gesetzt (oder cache_dir=None), wird nichts auf die Festplatte geschrieben.
+        :param n_workers: Anzahl der Prozesse, auf die die Generierung verteilt wird. Jeder Datensatz (bzw. jeder Block
+                          von ARRAY_BLOCK_SIZE Verläufen) zieht aus einem eigenen, per SeedSequence.spawn aus
+                          random_seed und stream_key abgeleiteten Zufallsstrom, das Ergebnis hängt daher nicht von
+                          n_workers ab.
         """
         self.models = []  # Liste zur Speicherung der MonodModel-Instanzen
         self.results = []  # Liste zur Speicherung der Ergebnisse jeder Instanz
+        self.array_backed = array_backed  # Speicherung als Array statt als MonodModel-Instanzen
+        self.data = None  # np.ndarray (n_datasets, 4, Zeit) mit X, S, P, u, nur wenn array_backed=True
+        self.params = None  # Parametertabelle (PARAM_TABLE_DTYPE), eine Zeile pro Verlauf, nur wenn array_backed=True
+        self.masks = None  # Masken der Fehler ('noise', 'outliers', 'missing') in data, nur wenn array_backed=True
         self.n_datasets = n_datasets  # Anzahl der zu generierenden Datensätze
         self.random_seed = random_seed  # Zufallssamen für die Reproduzierbarkeit
         self.generate_custom_datasets = generate_custom_datasets  # Steuerung der Generierung von benutzerdefinierten Datensätzen
         self.generate_defaults = generate_defaults  # Steuerung der Generierung der Standard-Datensätze
+        self.cache_dir = cache_dir  # Verzeichnis des Caches der Standard-Datensätze
+        self.n_workers = n_workers  # Anzahl der Prozesse für die Generierung
+        self.stream_key = 0  # Erster Eintrag des spawn_key der Zufallsströme, Standard-Datensätze nutzen ihre Nummer
 
         if self.random_seed is not None and type(self.random_seed) == int:
             seed(self.random_seed)  # Setzt den Zufallssamen für die Reproduzierbarkeit
@@ -171,10 +745,8 @@ class Datensatz:
         else:
             raise ValueError("You need to set a random seed!")
 
-        # Standard-Datensätze als separate Instanzen
-        self.default_dataset_1 = None
-        self.default_dataset_2 = None
-        self.default_dataset_3 = None
+        # Standard-Datensätze als separate Instanzen, werden erst beim ersten Zugriff erstellt
+        self._default_datasets = {}
 
         # Generiere benutzerdefinierte Datensätze nur, wenn es explizit angefordert wird
         if self.generate_custom_datasets:
@@ -182,12 +754,6 @@ class Datensatz:
             self.error_options = self.calculate_error_options()  # Berechnet die Fehleroptionen auf Basis der Verteilung
             self.generate_datasets()  # Generiert benutzerdefinierte Datensätze bei der Initialisierung
 
-        # Generiere Standard-Datensätze nur, wenn es explizit angefordert wird
-        if self.generate_defaults:
-            self.create_default_dataset_1()
-            self.create_default_dataset_2()
-            self.create_default_dataset_3()
-
     def _default_error_distribution(self):
         """
         Definiert die standardmäßige Fehlerverteilung.
@@ -211,21 +777,8 @@ class Datensatz:
 
         :return: Liste der Fehleroptionen, die zur Erzeugung der Datensätze verwendet werden.
         """
-        options = []
-        total_percentage = sum(self.error_distribution.values())
-
-        if total_percentage != 100:
-            raise ValueError("Die Summe der prozentualen Verteilung muss 100 ergeben.")
-
-        for error_option, percentage in self.error_distribution.items():
-            count = int((percentage / 100) * self.n_datasets)
-            # Split string to list if necessary (e.g., 'noise,outliers' -> ['noise', 'outliers'])
-            error_list = error_option.split(',')
-            options.extend([error_list] * count)
-
-        # If there's any discrepancy due to rounding, adjust to match n_datasets
-        while len(options) < self.n_datasets:
-            options.append(['none'])  # Default to 'none' if needed
+        # Split string to list (e.g., 'noise,outliers' -> ['noise', 'outliers']), rounding leftovers get 'none'
+        options = count_error_options(self.error_distribution, self.n_datasets)
 
         # Shuffle options to randomize order
         np.random.shuffle(options)
@@ -235,80 +788,145 @@ class Datensatz:
         """
         Generiert mehrere benutzerdefinierte Datensätze mit verschiedenen Fehlerkonfigurationen basierend auf der Verteilung.
         """
-        for errors in self.error_options:
-            add_errors = 'none' not in errors
-            apply_noise = 'noise' in errors
-            apply_outliers = 'outliers' in errors
-            apply_missing_values = 'missing' in errors
-
-            model = MonodModel(
-                add_errors=add_errors,
-                apply_noise=apply_noise,
-                apply_outliers=apply_outliers,
-                apply_missing_values=apply_missing_values
-            )
-            result = model.calculate_monod()  # Berechnet Monod-Kinetik
+        if self.array_backed:
+            self.generate_arrays()
+            return
+        # Ein unabhängiger Zufallsstrom pro Datensatz, unabhängig davon, welcher Prozess ihn berechnet
+        streams = self._seed_sequence().spawn(len(self.error_options))
+        for model in _map(_generate_model, list(zip(self.error_options, streams)), self.n_workers):
             self.models.append(model)
-            self.results.append(result)
+            self.results.append(model.Results)
+
+    def _seed_sequence(self):
+        """
+        Gibt die SeedSequence zurück, aus der die Zufallsströme der Datensätze bzw. Blöcke abgeleitet werden.
+        """
+        return np.random.SeedSequence(self.random_seed, spawn_key=(self.stream_key,))
+
+    def generate_arrays(self):
+        """
+        Generiert alle benutzerdefinierten Datensätze in einem vektorisierten Durchlauf: Die Parameter werden als
+        Tabelle gezogen, alle Verläufe gemeinsam mit calculate_monod_batch() berechnet und die Fehler blockweise
+        hinzugefügt. Das Ergebnis liegt in self.data (n_datasets, 4, Zeit) und self.params, die Positionen der
+        Fehler als boolesche Masken in self.masks (siehe add_random_errors_batch()).
+        """
+        errors = self.error_options
+        blocks = [errors[start:start + ARRAY_BLOCK_SIZE] for start in range(0, len(errors), ARRAY_BLOCK_SIZE)]
+        streams = self._seed_sequence().spawn(len(blocks))
+        results = _map(_generate_block, list(zip(blocks, streams)), self.n_workers)
+        if not results:  # an empty block keeps the shapes (0, 4, DURATION) of the generated data
+            results = [_generate_block(([], self._seed_sequence()))]
+        self.params = np.concatenate([params for params, _, _ in results])
+        self.data = np.concatenate([data for _, data, _ in results])
+        self.masks = {name: np.concatenate([masks[name] for _, _, masks in results]) for name in results[0][2]}
+
+    def export_shards(self, directory, n_curves=None, chunk_size=ARRAY_BLOCK_SIZE, file_format='npy'):
+        """
+        Schreibt einen Datensatz mit der Fehlerverteilung und dem Zufallssamen dieses Datensatzes blockweise in
+        directory, ohne ihn vollständig im Speicher zu halten (siehe export_dataset()). Die Verläufe werden dabei neu
+        generiert, n_curves kann daher auch weit über n_datasets liegen.
+
+        :param directory: Zielverzeichnis der Shards und der manifest.json.
+        :param n_curves: Anzahl der Verläufe, Standard ist n_datasets.
+        :param chunk_size: Anzahl der Verläufe pro Shard.
+        :param file_format: 'npy' (memory-mapbar) oder 'parquet'.
+        :return: Dictionary, das Manifest des Exports.
+        """
+        error_distribution = getattr(self, 'error_distribution', None) or self._default_error_distribution()
+        return export_dataset(directory, self.n_datasets if n_curves is None else n_curves, self.random_seed,
+                              error_distribution, chunk_size=chunk_size, file_format=file_format,
+                              n_workers=self.n_workers)
+
+    def _load_or_create_default_dataset(self, number, error_distribution, create):
+        """
+        Lädt Standard-Datensatz number aus dem Cache (Schlüssel: Zufallssamen und Fehlerverteilung) oder erstellt ihn
+        mit create() und speichert ihn im Cache. Fehler beim Lesen oder Schreiben des Caches führen nur zur
+        Neuberechnung.
+
+        :return: Datensatz
+        """
+        if self.cache_dir is None:
+            return create()
+        key = json.dumps({'version': CACHE_VERSION, 'dataset': number, 'random_seed': self.random_seed,
+                          'error_distribution': error_distribution}, sort_keys=True)
+        path = os.path.join(self.cache_dir,
+                            f'default_dataset_{number}_{hashlib.sha256(key.encode()).hexdigest()[:16]}.pkl')
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+            pass
+
+        dataset = create()
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as file:
+                pickle.dump(dataset, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)  # Andere Prozesse sehen nie eine halb geschriebene Datei
+        except OSError:
+            pass
+        return dataset
 
     def create_default_dataset_1(self):
         """
         Erstellt eine separate Instanz von Datensatz für Standard-Datensatz 1.
         Vier MonodModelle, keine Fehler und jede Fehleroption einzeln.
         """
-        if self.default_dataset_1 is None:
+        if self._default_datasets.get(1) is None:
             # print("Erstelle Standard-Datensatz 1 (vier Modelle: keine Fehler und jede Fehleroption einzeln)")
-            self.default_dataset_1 = Datensatz(
-                n_datasets=4,
-                random_seed=self.random_seed,
-                generate_custom_datasets=True,
-                generate_defaults=False
-            )
-            self.default_dataset_1.models = [
-                MonodModel(add_errors=False),
-                MonodModel(add_errors=True, apply_noise=True),
-                MonodModel(add_errors=True, apply_outliers=True),
-                MonodModel(add_errors=True, apply_missing_values=True)
-            ]
-            for model in self.default_dataset_1.models:
-                model.calculate_monod()
+            def create():
+                dataset = Datensatz(
+                    n_datasets=4,
+                    random_seed=self.random_seed,
+                    generate_custom_datasets=False,
+                    generate_defaults=False
+                )
+                dataset.stream_key = 1
+                errors = [['none'], ['noise'], ['outliers'], ['missing']]
+                streams = dataset._seed_sequence().spawn(len(errors))
+                dataset.models = [_generate_model(task) for task in zip(errors, streams)]
+                return dataset
+
+            error_distribution = {'none': 25, 'noise': 25, 'outliers': 25, 'missing': 25}
+            self.default_dataset_1 = self._load_or_create_default_dataset(1, error_distribution, create)
 
     def create_default_dataset_2(self):
         """
         Erstellt eine separate Instanz von Datensatz für Standard-Datensatz 2.
         Kleiner Datensatz mit 10-20 Modellen und geringer Fehlerverteilung.
         """
-        if self.default_dataset_2 is None:
+        if self._default_datasets.get(2) is None:
             # print("Erstelle Standard-Datensatz 2 (kleiner Datensatz mit geringer Fehlerverteilung)")
-            self.default_dataset_2 = Datensatz(
-                n_datasets=20,  # Setze n_datasets auf 20 für den kleinen Datensatz
-                random_seed=self.random_seed,
-                generate_custom_datasets=False,
-                generate_defaults=False
-            )
             small_error_distribution = {
                 'none': 60,
                 'noise': 15,
                 'outliers': 10,
                 'missing': 15
             }
-            self.default_dataset_2.error_distribution = small_error_distribution
-            self.default_dataset_2.error_options = self.default_dataset_2.calculate_error_options()
-            self.default_dataset_2.generate_datasets()
+
+            def create():
+                dataset = Datensatz(
+                    n_datasets=20,  # Setze n_datasets auf 20 für den kleinen Datensatz
+                    random_seed=self.random_seed,
+                    generate_custom_datasets=False,
+                    generate_defaults=False
+                )
+                dataset.stream_key = 2
+                dataset.error_distribution = small_error_distribution
+                dataset.error_options = dataset.calculate_error_options()
+                dataset.generate_datasets()
+                return dataset
+
+            self.default_dataset_2 = self._load_or_create_default_dataset(2, small_error_distribution, create)
 
     def create_default_dataset_3(self):
         """
         Erstellt eine separate Instanz von Datensatz für Standard-Datensatz 3.
         Großer Datensatz mit über 1000 Modellen und voller Fehlerverteilung.
         """
-        if self.default_dataset_3 is None:
+        if self._default_datasets.get(3) is None:
             # print("Erstelle Standard-Datensatz 3 (großer Datensatz mit voller Fehlerverteilung)")
-            self.default_dataset_3 = Datensatz(
-                n_datasets=1000,  # Setze n_datasets auf 1000 für den großen Datensatz
-                random_seed=self.random_seed,
-                generate_custom_datasets=False,
-                generate_defaults=False
-            )
             large_error_distribution = {
                 'none': 20,
                 'noise': 15,
@@ -319,9 +937,21 @@ class Datensatz:
                 'outliers,missing': 10,
                 'noise,outliers,missing': 5
             }
-            self.default_dataset_3.error_distribution = large_error_distribution
-            self.default_dataset_3.error_options = self.default_dataset_3.calculate_error_options()
-            self.default_dataset_3.generate_datasets()
+
+            def create():
+                dataset = Datensatz(
+                    n_datasets=1000,  # Setze n_datasets auf 1000 für den großen Datensatz
+                    random_seed=self.random_seed,
+                    generate_custom_datasets=False,
+                    generate_defaults=False
+                )
+                dataset.stream_key = 3
+                dataset.error_distribution = large_error_distribution
+                dataset.error_options = dataset.calculate_error_options()
+                dataset.generate_datasets()
+                return dataset
+
+            self.default_dataset_3 = self._load_or_create_default_dataset(3, large_error_distribution, create)
 
     def plot_default_dataset_1(self):
         """
@@ -330,6 +960,7 @@ class Datensatz:
         if not self.default_dataset_1:
             print("Standard-Datensatz 1 ist nicht generiert.")
             return
+        import matplotlib.pyplot as plt
 
         fig, axes = plt.subplots(2, 2, figsize=(12, 8))
         fig.suptitle("Standard-Datensatz 1: Verläufe von 4 Modellen")
@@ -355,6 +986,7 @@ class Datensatz:
         if not self.default_dataset_2:
             print("Standard-Datensatz 2 ist nicht generiert.")
             return
+        import matplotlib.pyplot as plt
 
         models_per_plot = 20  # Anzahl der Modelle pro Graphik
         total_models = len(self.default_dataset_2.models)
@@ -388,6 +1020,7 @@ class Datensatz:
         if not self.default_dataset_3:
             print("Standard-Datensatz 3 ist nicht generiert.")
             return
+        import matplotlib.pyplot as plt
 
         # Stelle sicher, dass mindestens ein Modell pro Fehleroption dabei ist
         errors_options_present = set()
@@ -438,25 +1071,65 @@ class Datensatz:
         plt.tight_layout(rect=[0, 0, 1, 0.95])
         plt.show()
 
+    def fit_models(self, loss='soft_l1', f_scale=0.05, max_iter=100):
+        """
+        Passt umax, Ks, Yx, k1 sowie S0 und X0 für alle Modelle des Datensatzes gleichzeitig an deren (fehlerbehaftete)
+        Ergebnisse an, siehe fit_monod_batch(). Die robuste Verlustfunktion dämpft den Einfluss von Ausreißern,
+        fehlende Werte (NaN) werden ignoriert.
+
+        :param loss: Verlustfunktion 'soft_l1', 'huber' oder 'linear' (kleinste Quadrate).
+        :param f_scale: Skalierte Abweichung, ab der die robuste Verlustfunktion abflacht.
+        :param max_iter: Maximale Anzahl an Iterationen pro Modell.
+        :return: pd.DataFrame mit einer Zeile pro Modell: angepasste Parameter, wahre Parameter (Suffix '_true'),
+                 Kosten, Iterationen, Konvergenz und die angewendeten Fehlerarten. Nicht konvergierte Anpassungen
+                 werden mit einer Warnung gemeldet.
+        """
+        import pandas as pd
+
+        flags = ['apply_noise', 'apply_outliers', 'apply_missing_values']
+        if self.array_backed:
+            data = self.data[:, :3]
+            true_params = pd.DataFrame(self.params[list(BATCH_FIT_PARAMETERS)].tolist(),
+                                       columns=list(BATCH_FIT_PARAMETERS))
+            applied = pd.DataFrame(self.params[flags].tolist(), columns=flags)
+        else:
+            data = np.array([[model.Results[name] for name in ('X', 'S', 'P')] for model in self.models], dtype=float)
+            true_params = pd.DataFrame([model.get_params() for model in self.models])
+            applied = pd.DataFrame([[getattr(model, flag) for flag in flags] for model in self.models], columns=flags)
+        fit = fit_monod_batch(data, loss=loss, f_scale=f_scale, max_iter=max_iter)
+        if not np.all(fit['converged']):
+            warnings.warn(f'{np.sum(~fit["converged"])} of {len(data)} fits did not converge within {max_iter} '
+                          f'iterations, see the column "converged".')
+        table = pd.DataFrame(fit['params'], columns=list(BATCH_FIT_PARAMETERS))
+        table = table.join(true_params.add_suffix('_true'))
+        table['cost'], table['iterations'], table['converged'] = fit['cost'], fit['iterations'], fit['converged']
+        return table.join(applied)
+
     def __getitem__(self, index):
         """
         Ermöglicht den listartigen Zugriff auf die generierten Datensätze.
+        Bei array_backed=True wird eine MonodView auf die Arrays zurückgegeben.
         """
-        if index < 0 or index >= len(self.models):
+        if index < 0 or index >= len(self):
             raise IndexError("Index außerhalb des gültigen Bereichs")
+        if self.array_backed:
+            return MonodView(self.data[index], self.params[index])
         return self.models[index]
 
     def __len__(self):
         """
-        Gibt die Anzahl der generierten MonodModel-Instanzen zurück.
+        Gibt die Anzahl der generierten MonodModel-Instanzen (bzw. Verläufe bei array_backed=True) zurück.
         """
+        if self.array_backed:
+            return 0 if self.data is None else len(self.data)
         return len(self.models)
 
     def plot_all_results(self):
         """
         Plottet die Ergebnisse aller generierten Datensätze.
         """
-        for i, model in enumerate(self.models):
+        for i in range(len(self)):
+            model = self[i]
             print(f"Plotting Dataset {i + 1}")
             model.plot_results()
             # Entfernen Sie 'break', um alle Datensätze zu plotten
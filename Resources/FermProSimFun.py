@@ -1,16 +1,880 @@
 # Fermentation Process Simulator
 # noinspection PySingleQuotedDocstring
+# Plotting, pandas, scikit-learn and scipy are imported where they are needed, so that processes which only
+# simulate start quickly (see benchmarks/import_time.py).
 import os
-from math import ceil
+import struct
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations, islice
+from math import ceil, comb
 from random import uniform
-import matplotlib.pyplot as plt
 from datetime import datetime
 import json
+from typing import TYPE_CHECKING
 
 import numpy as np
-import pandas as pd
-import sklearn.metrics
-from scipy.optimize import Bounds, minimize
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Order of the state variables along axis 1 of calculate_monod_ensemble()
+MONOD_VARIABLES = ('X', 'S', 'P', 'u', 'rX', 'rS', 'rP')
+# Fitted model parameters and their bounds (lower, upper) used by MonodModel.fit_model()
+FIT_PARAMETERS = ('umax', 'Ks', 'Yx', 'k1')
+FIT_BOUNDS = ([0.5, 7, 0.4, 0.05], [1.1, 10, 0.6, 0.2])
+# Order of the state variables along axis 1 of simulate_fed_ensemble()
+FED_VARIABLES = ('X', 'S', 'P', 'V')
+# Uniform prior ranges (low, high) of the randomly drawn parameters and starting conditions of MonodModel()
+PARAM_PRIORS = {'umax': (0.5, 1.1), 'Ks': (7, 10), 'Yx': (0.4, 0.6), 'k1': (0.05, 0.2), 'S0': (19, 21),
+                'X0': (0.05, 0.3)}
+
+
+def calculate_monod_ensemble(umax, Ks, Yx, k1, S0, X0, P0=0, duration: int = 24, u0=0):
+    '''
+    Calculates monod kinetics for many parameter sets and starting conditions at once.
+    All inputs are scalars or 1D arrays of equal length (one entry per run), they are broadcast against each
+    other. Every run is stepped with the same hourly update as MonodModel.calculate_monod.
+        Output:
+            ensemble: np.ndarray, shape (n_runs, len(MONOD_VARIABLES), duration)
+
+    >>> ensemble = calculate_monod_ensemble([0.6, 0.9], 8, 0.5, 0.1, 20, 0.1)
+    >>> ensemble.shape == (2, len(MONOD_VARIABLES), 24)
+    True
+    '''
+    umax, Ks, Yx, k1, S0, X0, P0, u0 = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (umax, Ks, Yx, k1, S0, X0, P0, u0)))
+    n_runs = umax.shape[0]
+    if n_runs == 1:
+        return np.array(calculate_monod_run(umax[0], Ks[0], Yx[0], k1[0], S0[0], X0[0], P0[0], duration, u0[0]))[None]
+
+    # Variables are stored as contiguous rows of all runs per timestep
+    ensemble = np.empty((len(MONOD_VARIABLES), duration, n_runs))
+    X, S, P, u, rX, rS, rP = ensemble
+
+    X[0], S[0], P[0], u[0] = X0, S0, P0, u0
+    rX[0] = u0 * X0
+    rS[0] = -(rX[0] / (Yx / S0))
+    rP[0] = (k1 * u0) * X0
+
+    for j in range(1, duration):
+        X[j], S[j], P[j], u[j], rX[j], rS[j], rP[j] = monod_step(X[j - 1], S[j - 1], P[j - 1], u[j - 1], rX[j - 1],
+                                                                 umax, Ks, Yx, k1)
+
+    return np.ascontiguousarray(ensemble.transpose(2, 0, 1))
+
+
+def calculate_monod_run(umax, Ks, Yx, k1, S0, X0, P0=0, duration: int = 24, u0=0):
+    '''
+    Calculates monod kinetics for a single parameter set with plain floats, bit-identical to the same run of
+    calculate_monod_ensemble() but without the overhead of 1-element arrays in every step.
+        Output:
+            run: tuple of Lists, the variables in the order of MONOD_VARIABLES
+
+    >>> X, S, P, u, rX, rS, rP = calculate_monod_run(0.6, 8, 0.5, 0.1, 20, 0.1)
+    >>> len(X) == 24
+    True
+    '''
+    umax, Ks, Yx, k1, S0, X0, P0, u0 = (float(value) for value in (umax, Ks, Yx, k1, S0, X0, P0, u0))
+    X, S, P, u = [X0], [S0], [P0], [u0]
+    rX, rS, rP = [u0 * X0], [-(u0 * X0 / (Yx / S0))], [(k1 * u0) * X0]
+
+    # The hourly batch update of monod_step() written out, a function call per step would dominate the run time
+    for j in range(1, duration):
+        new_u = umax * S[j - 1] / (Ks + S[j - 1])
+        new_u = new_u if new_u >= 0 else 0.0
+        new_rX = u[j - 1] * X[j - 1]
+        new_rX = new_rX if new_rX >= 0 else 0.0
+        new_rS = -(rX[j - 1] / Yx)
+        new_rS = new_rS if new_rS <= 0 else 0.0
+        new_X = X[j - 1] + new_rX
+        new_S = S[j - 1] + new_rS
+        new_S = 0.0 if new_S < 0 else new_S
+        new_rP = (k1 * new_u) * new_X
+        new_rP = new_rP if new_rP >= 0 else 0.0
+
+        X.append(new_X)
+        S.append(new_S)
+        P.append(P[j - 1] + new_rP)
+        u.append(new_u)
+        rX.append(new_rX)
+        rS.append(new_rS)
+        rP.append(new_rP)
+
+    return X, S, P, u, rX, rS, rP
+
+
+def _monod_step_float(X, S, P, u, rX, umax, Ks, Yx, k1, D=None, Sf=0.0, dt: float = 1.0):
+    '''
+    monod_step() for a single run of plain floats, the clamps are written like np.where so the results are identical.
+    '''
+    new_u = umax * S / (Ks + S)
+    new_u = new_u if new_u >= 0 else 0.0
+
+    new_rX = u * X
+    new_rX = new_rX if new_rX >= 0 else 0.0
+    new_rS = -(rX / Yx)
+    new_rS = new_rS if new_rS <= 0 else 0.0
+    if D is None:
+        new_X = X + new_rX * dt
+        new_S = S + new_rS * dt
+    else:
+        new_X = X + (new_rX - D * X) * dt
+        new_S = S + (new_rS + D * (Sf - S)) * dt
+    new_S = 0.0 if new_S < 0 else new_S
+
+    new_rP = (k1 * new_u) * new_X
+    new_rP = new_rP if new_rP >= 0 else 0.0
+    if D is None:
+        new_P = P + new_rP * dt
+    else:
+        new_P = P + (new_rP - D * P) * dt
+
+    return new_X, new_S, new_P, new_u, new_rX, new_rS, new_rP
+
+
+def monod_step(X, S, P, u, rX, umax, Ks, Yx, k1, D=None, Sf=0, dt: float = 1.0):
+    '''
+    Advances monod kinetics by one time step of dt hours, starting from the state (X, S, P, u, rX) of the previous step.
+    With a dilution rate D [h^-1] the balances include the substrate feed of concentration Sf [g/L] and the dilution
+    of all concentrations (fed-batch and continuous operation). With D=None and dt=1 this is the hourly batch update
+    of calculate_monod_ensemble(). All inputs may be scalars or arrays of runs, a single run of floats is stepped
+    without arrays.
+        Output:
+            new_state: tuple, (X, S, P, u, rX, rS, rP) of the new step
+    '''
+    if all(isinstance(value, float) for value in (X, S, P, u, rX, umax, Ks, Yx, k1)) and np.ndim(D) == 0:
+        return _monod_step_float(X, S, P, u, rX, umax, Ks, Yx, k1, D, Sf, dt)
+
+    new_u = umax * S / (Ks + S)                                 # Change of µ
+    new_u = np.where(new_u >= 0, new_u, 0)
+
+    new_rX = u * X                                              # Derivative of Biomass
+    new_rX = np.where(new_rX >= 0, new_rX, 0)
+    new_rS = -(rX / Yx)                                         # Derivative of substrate
+    new_rS = np.where(new_rS <= 0, new_rS, 0)
+    if D is None:
+        new_X = X + new_rX * dt                                 # New [Biomass]
+        new_S = S + new_rS * dt
+    else:
+        new_X = X + (new_rX - D * X) * dt
+        new_S = S + (new_rS + D * (Sf - S)) * dt
+    new_S = np.where(new_S < 0, 0, new_S)                       # New [Substrate]
+
+    new_rP = (k1 * new_u) * new_X                               # Derivative of product
+    new_rP = np.where(new_rP >= 0, new_rP, 0)
+    if D is None:
+        new_P = P + new_rP * dt                                 # New [Product]
+    else:
+        new_P = P + (new_rP - D * P) * dt
+
+    return new_X, new_S, new_P, new_u, new_rX, new_rS, new_rP
+
+
+def calculate_monod_sensitivities(umax, Ks, Yx, k1, S0, X0, P0=0, duration: int = 24, u0=0):
+    '''
+    Calculates monod kinetics like calculate_monod_ensemble() together with the forward sensitivities of X, S and P
+    with respect to the parameters in FIT_PARAMETERS (umax, Ks, Yx, k1). The sensitivities are the exact derivatives
+    of the hourly update, clamped values have zero sensitivity.
+        Output:
+            ensemble: np.ndarray, shape (n_runs, len(MONOD_VARIABLES), duration)
+            sensitivities: np.ndarray, shape (n_runs, 3, len(FIT_PARAMETERS), duration), d[X, S, P]/d[umax, Ks, Yx, k1]
+    '''
+    umax, Ks, Yx, k1, S0, X0, P0, u0 = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (umax, Ks, Yx, k1, S0, X0, P0, u0)))
+    n_runs, n_params = umax.shape[0], len(FIT_PARAMETERS)
+    ensemble = calculate_monod_ensemble(umax, Ks, Yx, k1, S0, X0, P0, duration=duration, u0=u0)
+    X, S, P, u, rX = (ensemble[:, i].T for i in range(5))
+    unit = np.eye(n_params)
+
+    sensitivities = np.zeros((3, duration, n_runs, n_params))
+    dX, dS, dP = sensitivities
+    du_prev, drX_prev = np.zeros((n_runs, n_params)), np.zeros((n_runs, n_params))
+
+    for j in range(1, duration):
+        S_prev = S[j - 1][:, None]
+        new_u = umax * S[j - 1] / (Ks + S[j - 1])
+        du = (unit[0] * S_prev / (Ks[:, None] + S_prev)
+              - unit[1] * (umax * S[j - 1] / (Ks + S[j - 1]) ** 2)[:, None]
+              + dS[j - 1] * (umax * Ks / (Ks + S[j - 1]) ** 2)[:, None])
+        du *= (new_u >= 0)[:, None]
+
+        new_rX = u[j - 1] * X[j - 1]
+        drX = (du_prev * X[j - 1][:, None] + u[j - 1][:, None] * dX[j - 1]) * (new_rX >= 0)[:, None]
+        dX[j] = dX[j - 1] + drX
+
+        new_rS = -(rX[j - 1] / Yx)
+        drS = (-drX_prev / Yx[:, None] + unit[2] * (rX[j - 1] / Yx ** 2)[:, None]) * (new_rS <= 0)[:, None]
+        dS[j] = (dS[j - 1] + drS) * (S[j - 1] + np.where(new_rS <= 0, new_rS, 0) >= 0)[:, None]
+
+        new_rP = (k1 * u[j]) * X[j]
+        drP = (unit[3] * (u[j] * X[j])[:, None]
+               + k1[:, None] * (du * X[j][:, None] + u[j][:, None] * dX[j])) * (new_rP >= 0)[:, None]
+        dP[j] = dP[j - 1] + drP
+
+        du_prev, drX_prev = du, drX
+
+    return ensemble, np.ascontiguousarray(sensitivities.transpose(2, 0, 3, 1))
+
+
+def fisher_information(sensitivities, schedules=None, sigma=0.1):
+    '''
+    Fisher information matrices of the parameters in FIT_PARAMETERS for offline sampling schedules, assuming
+    independent normal measurement noise on X, S and P. The information of a schedule is the sum of the information
+    of its sampling times, so all schedules are evaluated from the sensitivities of one simulation.
+    :param sensitivities: np.ndarray of shape (3, len(FIT_PARAMETERS), duration), sensitivities of one run from
+        calculate_monod_sensitivities()
+    :param schedules: list of sampling hours (one schedule) or array of shape (n_schedules, k), default: the
+        information of every single hour
+    :param sigma: float or list, noise standard deviation, optionally per variable [X, S, P]
+    :return: np.ndarray of shape (4, 4) for one schedule, (n_schedules, 4, 4) for several schedules or
+        (duration, 4, 4) per hour if schedules is None
+    '''
+    scaled = np.asarray(sensitivities, dtype=float) / np.broadcast_to(np.asarray(sigma, dtype=float), 3)[:, None, None]
+    per_time = np.einsum('vpt,vqt->tpq', scaled, scaled)
+    if schedules is None:
+        return per_time
+    return per_time[np.asarray(schedules, dtype=int)].sum(axis=-3)
+
+
+def d_optimal_schedule(information, k: int, candidates=None, method: str = 'exchange', max_exhaustive: int = 4096):
+    '''
+    Searches the schedule of k distinct sampling times that maximizes the determinant of the Fisher information
+    (D-optimal design). method='exhaustive' evaluates all combinations of the candidate times in vectorized batches,
+    method='exchange' starts from a greedy design and swaps single times (Fedorov exchange) while the determinant
+    increases, which finds a local optimum with cost growing with the number of candidates only (the default).
+    method='auto' is exhaustive for at most max_exhaustive combinations, the exhaustive search is meant for small
+    problems and tests. Raises ValueError for unknown methods or k larger than the number of candidates.
+    :param information: np.ndarray of shape (duration, n_params, n_params), per hour, see fisher_information()
+    :param k: int, number of samples
+    :param candidates: list, candidate sampling hours, default all hours
+    :return: tuple, sorted sampling hours and the log-determinant of their information (-inf if singular)
+    '''
+
+    information = np.asarray(information, dtype=float)
+    candidates = np.arange(len(information)) if candidates is None else np.unique(np.asarray(candidates, dtype=int))
+    if k > len(candidates):
+        raise ValueError(f'Cannot choose {k} distinct sampling times from {len(candidates)} candidates.')
+    if method == 'auto':
+        method = 'exhaustive' if comb(len(candidates), k) <= max_exhaustive else 'exchange'
+
+    if method == 'exhaustive':
+        chosen, best_value = _exhaustive_schedule(information[candidates], k)
+    elif method == 'exchange':
+        chosen, best_value = _exchange_schedule(information[candidates], k)
+    else:
+        raise ValueError(f'Unknown search method "{method}". Choose "auto", "exhaustive" or "exchange".')
+
+    return sorted(int(t) for t in candidates[chosen]), float(best_value)
+
+
+def _log_det(matrices):
+    '''
+    Log-determinants of a stack of information matrices, -inf for singular or indefinite ones.
+    '''
+    sign, value = np.linalg.slogdet(matrices)
+    return np.where(sign > 0, value, -np.inf)
+
+
+def _exhaustive_schedule(information, k: int):
+    '''
+    Evaluates all combinations of k of the candidate information matrices in vectorized batches.
+    :param information: np.ndarray of shape (n_candidates, n_params, n_params)
+    :return: tuple, positions of the best combination in information and its log-determinant
+    '''
+    best, best_value = None, -np.inf
+    schedules = combinations(range(len(information)), k)
+    while True:
+        batch = np.fromiter((i for schedule in islice(schedules, 2 ** 16) for i in schedule), dtype=int)
+        if not len(batch):
+            break
+        batch = batch.reshape(-1, k)
+        values = _log_det(information[batch].sum(axis=1))
+        if best is None or values.max() > best_value:
+            best, best_value = batch[np.argmax(values)], values.max()
+    return best, best_value
+
+
+def _exchange_schedule(information, k: int):
+    '''
+    Starts from a greedy design of k of the candidate information matrices and swaps single candidates (Fedorov
+    exchange) while the determinant increases.
+    :param information: np.ndarray of shape (n_candidates, n_params, n_params)
+    :return: tuple, positions of the chosen candidates in information and their log-determinant
+    '''
+    # greedy start, a small ridge keeps the determinant informative while fewer times than parameters are chosen
+    ridge = 1e-9 * np.trace(information, axis1=1, axis2=2).max() * np.eye(information.shape[1])
+    chosen = []
+    for _ in range(k):
+        values = _log_det(ridge + information[chosen].sum(axis=0) + information)
+        values[chosen] = -np.inf
+        chosen.append(int(np.argmax(values)))
+    chosen = np.array(chosen)
+    best_value = _log_det(information[chosen].sum(axis=0))
+    while True:
+        total = information[chosen].sum(axis=0)
+        # every swap of a chosen candidate (rows) with another candidate (columns)
+        values = _log_det(total - information[chosen][:, None] + information[None])
+        values[:, chosen] = -np.inf
+        position, candidate = np.unravel_index(np.argmax(values), values.shape)
+        if not values[position, candidate] > best_value + 1e-12:
+            break
+        chosen[position], best_value = candidate, values[position, candidate]
+    return chosen, best_value
+
+
+def monod_rhs(t, y, umax, Ks, Yx, k1):
+    '''
+    Right-hand side of the continuous monod kinetics for the state y = [X, S, P].
+    Negative substrate concentrations from overshooting solver steps are treated as depleted substrate.
+    '''
+    X, S = y[0], np.maximum(y[1], 0)
+    u = umax * S / (Ks + S)
+    rX = u * X
+    return np.array([rX, -rX / Yx, k1 * rX])
+
+
+def monod_jacobian(t, y, umax, Ks, Yx, k1):
+    '''
+    Analytic Jacobian d(monod_rhs)/dy of the continuous monod kinetics.
+    '''
+    X, S = y[0], max(y[1], 0)
+    u = umax * S / (Ks + S)
+    du_dS = umax * Ks / (Ks + S) ** 2 if y[1] > 0 else 0
+    return np.array([
+            [u,             du_dS * X,              0],
+            [-u / Yx,       -du_dS * X / Yx,        0],
+            [k1 * u,        k1 * du_dS * X,         0],
+            ])
+
+
+def solve_monod(umax, Ks, Yx, k1, S0, X0, P0=0, duration: int = 24, t_eval=None, method: str = 'LSODA',
+                rtol: float = 1e-6, atol: float = 1e-9):
+    '''
+    Integrates the continuous monod kinetics with an adaptive step size solver (scipy.integrate.solve_ivp).
+    The analytic Jacobian is used by the implicit methods ('LSODA', 'BDF', 'Radau').
+        Output:
+            solution: OdeResult, solution.sol(t) returns [X, S, P] at arbitrary times in [0, duration]
+
+    >>> solution = solve_monod(0.8, 8, 0.5, 0.1, 20, 0.1, t_eval=[0, 12, 23])
+    >>> solution.y.shape
+    (3, 3)
+    '''
+    from scipy.integrate import solve_ivp
+
+    return solve_ivp(monod_rhs, (0, duration), [X0, S0, P0], method=method, t_eval=t_eval, dense_output=True,
+                     jac=monod_jacobian, args=(umax, Ks, Yx, k1), rtol=rtol, atol=atol)
+
+
+def feed_schedule(feed_profile):
+    '''
+    Converts a feed profile into switch times and feed rates.
+    A feed profile is a constant feed rate F [L/h] or a list of (start time [h], F) pairs of a piecewise constant feed.
+        Output:
+            times: np.ndarray, sorted start times of the feed rates, the first one is 0
+            rates: np.ndarray, feed rates [L/h]
+
+    >>> feed_schedule([(6, 0.1), (0, 0), (20, 0.05)])
+    (array([ 0.,  6., 20.]), array([0.  , 0.1 , 0.05]))
+    '''
+    if np.ndim(feed_profile) == 0:
+        return np.zeros(1), np.array([feed_profile], dtype=float)
+    schedule = np.array(sorted(tuple(switch) for switch in feed_profile), dtype=float)
+    if schedule[0, 0] > 0:
+        schedule = np.vstack([[0, 0], schedule])
+    return schedule[:, 0], schedule[:, 1]
+
+
+def fed_monod_rhs(t, y, umax, Ks, Yx, k1, F, Sf, continuous=False):
+    '''
+    Right-hand side of the monod kinetics with feed for many runs at once.
+    The state y holds [X, S, P, V] of every run one after the other. In fed-batch operation the volume grows with the
+    feed rate F [L/h], in continuous operation the outflow equals the feed and the volume stays constant. All other
+    arguments are scalars or arrays with one entry per run.
+    '''
+    X, S, P, V = y.reshape(-1, 4).T
+    S = np.maximum(S, 0)
+    u = umax * S / (Ks + S)
+    D = F / V
+    dy = np.empty((len(X), 4))
+    dy[:, 0] = u * X - D * X
+    dy[:, 1] = -u * X / Yx + D * (Sf - S)
+    dy[:, 2] = k1 * u * X - D * P
+    dy[:, 3] = 0 if continuous else F
+    return dy.ravel()
+
+
+def simulate_fed_ensemble(umax, Ks, Yx, k1, S0, X0, feed_profiles: list, P0=0, V0=1.0, Sf=100.0,
+                          duration: float = 24, mode: str = 'fedbatch', t_eval=None, rtol: float = 1e-6,
+                          atol: float = 1e-8, S_depleted: float = 1e-2):
+    '''
+    Simulates fed-batch or continuous fermentations for many feed profiles with one adaptive solver call per feed
+    switch. The solver restarts exactly at every switch of any profile, so no fine fixed time grid is needed. Substrate
+    depletion (S falling below S_depleted) is located as a solver event for every run. Parameters and starting
+    conditions are scalars or arrays with one entry per feed profile. Raises AttributeError for unsupported modes.
+    :param feed_profiles: list, one feed profile per run, see feed_schedule()
+    :param mode: str, 'fedbatch' or 'continuous'
+    :param t_eval: list, output times [h], default hourly from 0 to duration - 1
+    :return: dict, 't': output times, 'y': np.ndarray of shape (n_runs, len(FED_VARIABLES), len(t)),
+        'depletion': first substrate depletion time of every run [h] (NaN if S stays above S_depleted),
+        'nfev': number of right-hand side evaluations
+
+    >>> fed = simulate_fed_ensemble(0.8, 8, 0.5, 0.1, 20, 0.1, [0.0, [(0, 0), (10, 0.05)]])
+    >>> fed['y'].shape
+    (2, 4, 24)
+    '''
+    from scipy.integrate import solve_ivp
+
+    if mode not in ('fedbatch', 'continuous'):
+        raise AttributeError('Unsupported mode of operation. Check to see if mode is one of "fedbatch" or '
+                             '"continuous".')
+    n_runs = len(feed_profiles)
+    umax, Ks, Yx, k1, S0, X0, P0, V0, Sf = (np.broadcast_to(np.asarray(value, dtype=float), n_runs)
+                                            for value in (umax, Ks, Yx, k1, S0, X0, P0, V0, Sf))
+    t_eval = np.arange(int(duration), dtype=float) if t_eval is None else np.asarray(t_eval, dtype=float)
+
+    schedules = [feed_schedule(profile) for profile in feed_profiles]
+    switches = np.unique(np.concatenate([[0, duration]] + [times for times, _ in schedules]))
+    switches = switches[(switches >= 0) & (switches <= duration)]
+    # feed rate of every run in every segment between two switches
+    segment_rates = np.array([rates[np.searchsorted(times, switches[:-1], side='right') - 1]
+                              for times, rates in schedules])
+
+    y = np.empty((n_runs, len(FED_VARIABLES), len(t_eval)))
+    depletion = np.full(n_runs, np.nan)
+    state = np.column_stack([X0, S0, P0, V0]).ravel()
+    nfev = 0
+
+    def depletion_event(run):
+        event = lambda t, y_ode, *args: y_ode[4 * run + 1] - S_depleted
+        event.direction = -1
+        return event
+
+    for segment, (t_start, t_end) in enumerate(zip(switches[:-1], switches[1:])):
+        F = segment_rates[:, segment]
+        is_last = t_end == switches[-1]
+        in_segment = (t_eval >= t_start) & ((t_eval <= t_end) if is_last else (t_eval < t_end))
+        n_out = np.count_nonzero(in_segment)
+        undepleted = np.flatnonzero(np.isnan(depletion))
+        # runs are only coupled through the step size, the Jacobian is banded by the [X, S, P, V] blocks
+        solution = solve_ivp(fed_monod_rhs, (t_start, t_end), state, method='LSODA',
+                             t_eval=np.unique(np.append(t_eval[in_segment], t_end)),
+                             events=[depletion_event(run) for run in undepleted],
+                             args=(umax, Ks, Yx, k1, F, Sf, mode == 'continuous'), rtol=rtol, atol=atol,
+                             lband=3, uband=3)
+        if not solution.success:
+            raise RuntimeError(f'Solver failed between {t_start} h and {t_end} h: {solution.message}')
+        y[:, :, in_segment] = solution.y[:, :n_out].reshape(n_runs, len(FED_VARIABLES), n_out)
+        for run, times in zip(undepleted, solution.t_events):
+            if len(times):
+                depletion[run] = times[0]
+        state = solution.y[:, -1]
+        nfev += solution.nfev
+
+    y[:, 1] = np.maximum(y[:, 1], 0)
+    return {'t': t_eval, 'y': y, 'depletion': depletion, 'nfev': nfev}
+
+
+def score_offline_sets(model_results, offline_sets, duration: int = None):
+    '''
+    Scores many offline sample sets against model trajectories without plotting and without changing the inputs.
+    All sets are placed on the hourly grid and linearly interpolated at once, missing samples (NaN) are interpolated
+    over and values before the first and after the last sample are held constant.
+    Raises ValueError if sampling times are not whole hours within the model duration.
+    :param model_results: dict with lists X, S, P (one trajectory for all sets) or np.ndarray of shape (3, duration)
+        or (n_sets, 3, duration) with the variables X, S, P
+    :param offline_sets: list of pd.DataFrame indexed by sampling hour with columns X, S, P (e.g. from
+        load_offline_values()), or np.ndarray of shape (n_sets, duration, 3) on the hourly grid with NaN between samples
+    :param duration: int, number of hourly time points, default from model_results
+    :return: pd.DataFrame, one row per set with the RMSE of X, S, P, the RMSE over all variables ('total') and the
+        mean over the hours of the RMSE across X, S and P ('hourly', the definition of calc_rmse() and plot_linear_fit())
+    '''
+    import pandas as pd
+
+    if isinstance(model_results, dict):
+        model_results = np.array([model_results['X'], model_results['S'], model_results['P']], dtype=float)
+    model_results = np.asarray(model_results, dtype=float)
+    duration = model_results.shape[-1] if duration is None else duration
+
+    if isinstance(offline_sets, np.ndarray):
+        grid = np.array(offline_sets, dtype=float)
+    else:
+        samples = pd.concat([offline_set[['X', 'S', 'P']] for offline_set in offline_sets],
+                            keys=range(len(offline_sets)))
+        set_idx = samples.index.get_level_values(0).to_numpy()
+        time_idx = samples.index.get_level_values(1).to_numpy(dtype=float)
+        if np.any(time_idx != np.round(time_idx)) or np.any((time_idx < 0) | (time_idx >= duration)):
+            raise ValueError(f'Sampling times must be whole hours between 0 and {duration - 1}.')
+        grid = np.full((len(offline_sets), duration, 3), np.nan)
+        grid[set_idx, time_idx.astype(int)] = samples.to_numpy(dtype=float)
+
+    # previous and next sample of every grid point, per set and variable
+    valid = ~np.isnan(grid)
+    steps = np.arange(duration)[None, :, None]
+    prev_idx = np.maximum.accumulate(np.where(valid, steps, -1), axis=1)
+    next_idx = np.flip(np.minimum.accumulate(np.flip(np.where(valid, steps, duration), axis=1), axis=1), axis=1)
+    prev_idx = np.where(prev_idx < 0, next_idx, prev_idx)
+    next_idx = np.where(next_idx >= duration, prev_idx, next_idx)
+    has_samples = prev_idx < duration
+    prev_idx, next_idx = np.where(has_samples, prev_idx, 0), np.where(has_samples, next_idx, 0)
+
+    prev_val = np.take_along_axis(grid, prev_idx, axis=1)
+    next_val = np.take_along_axis(grid, next_idx, axis=1)
+    span = np.where(next_idx > prev_idx, next_idx - prev_idx, 1)
+    interpolated = prev_val + (next_val - prev_val) * (steps - prev_idx) / span
+    interpolated[~has_samples] = np.nan
+
+    squared_error = (np.swapaxes(model_results, -1, -2) - interpolated) ** 2
+    rmse = pd.DataFrame(np.sqrt(squared_error.mean(axis=1)), columns=['X', 'S', 'P'])
+    rmse['total'] = np.sqrt(squared_error.mean(axis=(1, 2)))
+    rmse['hourly'] = np.sqrt(squared_error.mean(axis=2)).mean(axis=1)
+    return rmse
+
+
+def propagate_uncertainty(n_samples: int, priors: dict = None, duration: int = 24, P0=0, u0=0,
+                          variables=('X', 'S', 'P'), quantiles=(0.05, 0.5, 0.95), sampler: str = 'sobol',
+                          seed: int = None, chunk_size: int = 2 ** 14, bins: int = 1024):
+    '''
+    Propagates the uncertainty of the parameters and starting conditions (umax, Ks, Yx, k1, S0, X0) through the Monod
+    kinetics by Monte Carlo simulation. The samples are drawn from a quasi-random sequence in chunks of chunk_size
+    and every chunk is simulated at once with calculate_monod_ensemble(). Only running statistics per time point are
+    kept: mean and variance are merged exactly chunk by chunk, quantiles are read from a histogram with bins bins
+    whose range is set by the first chunk (widened by 10 %), so memory does not grow with n_samples. A quantile is
+    exact to within one bin width ('resolution'), values outside the histogram range are counted in the outer bins.
+    Raises ValueError for unknown priors or samplers.
+    :param n_samples: int, number of Monte Carlo samples
+    :param priors: dict, overrides PARAM_PRIORS per parameter with a range (low, high) for a uniform prior, a frozen
+        scipy.stats distribution (anything with a ppf method) or a number for a fixed value
+    :param variables: tuple, variables of MONOD_VARIABLES to summarize
+    :param quantiles: tuple, quantile levels between 0 and 1
+    :param sampler: str, 'sobol' (scrambled, chunk_size should be a power of 2), 'halton' or 'random'
+    :param seed: int, seed of the sampler
+    :param chunk_size: int, samples simulated at once
+    :param bins: int, histogram bins per variable and time point
+    :return: dict, 't': hourly time points, 'variables', 'n_samples', 'mean', 'variance', 'min', 'max' and
+        'resolution' as np.ndarray of shape (len(variables), duration), 'quantile_levels', 'quantiles' of shape
+        (len(quantiles), len(variables), duration), 'histogram' of shape (len(variables), duration, bins) and
+        'bin_edges' of shape (len(variables), duration, bins + 1)
+
+    >>> uq = propagate_uncertainty(2 ** 12, seed=0)
+    >>> uq['quantiles'].shape
+    (3, 3, 24)
+    '''
+    from scipy.stats import qmc
+
+    priors = dict(PARAM_PRIORS, **(priors or {}))
+    unknown = set(priors) - set(PARAM_PRIORS)
+    if unknown:
+        raise ValueError(f'Unknown priors {sorted(unknown)}. Choose from {list(PARAM_PRIORS)}.')
+    sampled = [name for name in PARAM_PRIORS if not np.isscalar(priors[name])]
+    if sampler == 'sobol':
+        engine = qmc.Sobol(d=len(sampled), seed=seed)
+        draw = engine.random
+    elif sampler == 'halton':
+        engine = qmc.Halton(d=len(sampled), seed=seed)
+        draw = engine.random
+    elif sampler == 'random':
+        rng = np.random.default_rng(seed)
+        draw = lambda n: rng.random((n, len(sampled)))
+    else:
+        raise ValueError(f'Unknown sampler "{sampler}". Choose "sobol", "halton" or "random".')
+
+    rows = [MONOD_VARIABLES.index(name) for name in variables]
+    levels = np.asarray(quantiles, dtype=float)
+    n_cells = len(rows) * duration
+    count = 0
+    mean = np.zeros((len(rows), duration))
+    m2 = np.zeros((len(rows), duration))
+    histogram = np.zeros(n_cells * bins, dtype=np.int64)
+
+    while count < n_samples:
+        n = min(chunk_size, n_samples - count)
+        values = dict(priors)
+        for name, u in zip(sampled, draw(n).T):
+            prior = priors[name]
+            values[name] = prior.ppf(u) if hasattr(prior, 'ppf') else prior[0] + (prior[1] - prior[0]) * u
+        data = calculate_monod_ensemble(values['umax'], values['Ks'], values['Yx'], values['k1'], values['S0'],
+                                        values['X0'], P0, duration, u0)
+        data = np.broadcast_to(data, (n,) + data.shape[1:])[:, rows]
+
+        if count == 0:
+            low, high = data.min(axis=0), data.max(axis=0)
+            margin = np.maximum(0.1 * (high - low), 1e-9 * np.maximum(np.abs(high), 1))
+            low, high = low - margin, high + margin
+            width = (high - low) / bins
+            minimum, maximum = low + margin, high - margin
+
+        # exact parallel merge of mean and sum of squared deviations
+        chunk_mean = data.mean(axis=0)
+        delta = chunk_mean - mean
+        m2 += ((data - chunk_mean) ** 2).sum(axis=0) + delta ** 2 * count * n / (count + n)
+        mean += delta * n / (count + n)
+        minimum, maximum = np.minimum(minimum, data.min(axis=0)), np.maximum(maximum, data.max(axis=0))
+
+        index = np.clip(((data - low) / width).astype(np.int64), 0, bins - 1)
+        index += (np.arange(n_cells) * bins).reshape(len(rows), duration)
+        histogram += np.bincount(index.ravel(), minlength=n_cells * bins)
+        count += n
+
+    histogram = histogram.reshape(len(rows), duration, bins)
+    cumulative = np.cumsum(histogram, axis=-1)
+    target = levels[:, None, None, None] * count
+    k = np.minimum((cumulative[None] < target).sum(axis=-1), bins - 1)
+    below = np.where(k > 0, np.take_along_axis(cumulative[None], np.maximum(k - 1, 0)[..., None], -1)[..., 0], 0)
+    in_bin = np.take_along_axis(histogram[None], k[..., None], -1)[..., 0]
+    fraction = np.clip((target[..., 0] - below) / np.maximum(in_bin, 1), 0, 1)
+    estimates = np.clip(low + (k + fraction) * width, minimum, maximum)
+
+    return {'t': np.arange(duration), 'variables': tuple(variables), 'n_samples': count, 'mean': mean,
+            'variance': m2 / max(count - 1, 1), 'min': minimum, 'max': maximum, 'resolution': width,
+            'quantile_levels': levels, 'quantiles': estimates, 'histogram': histogram,
+            'bin_edges': low[..., None] + width[..., None] * np.arange(bins + 1)}
+
+
+def render_results(time=None, results: dict = None, offline_values: 'pd.DataFrame' = None, offline_time=None,
+                   offline_linestyle: str = '', title: str = '', filename: str = None):
+    '''
+    Renders X, S and P of model results and/or offline samples with the object-oriented Matplotlib API.
+    The figure is not registered with pyplot, so nothing is displayed or blocks and no figures accumulate in loops.
+    :param time: list, time points of the results
+    :param results: dict, model results with X, S and P
+    :param offline_values: pd.DataFrame, offline samples with X, S and P
+    :param offline_time: list, time points of the offline samples, default is their index + 1 (as in plot_results)
+    :param offline_linestyle: str, line style connecting the offline samples
+    :param title: str
+    :param filename: str, writes the figure to file, the format follows the extension (e.g. .png, .svg, .pdf)
+    :return: matplotlib.figure.Figure
+    '''
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    ax = figure.add_subplot()
+    if results is not None:
+        ax.plot(time, results['X'], 'r', time, results['S'], 'g', time, results['P'], 'b')
+    if offline_values is not None:
+        off_time = offline_values.index + 1 if offline_time is None else offline_time
+        ax.plot(off_time, offline_values['X'], 'r', off_time, offline_values['S'], 'g', off_time, offline_values['P'],
+                'b', linestyle=offline_linestyle, marker='X')
+
+    ax.legend(['Biomass [g/L]', 'Substrate [g/L]', 'Product [g/L]'])
+    ax.set_ylabel('Biomass, Substrate & Product Concentration [g/L]')
+    ax.set_xlabel('Process Duration [h]')
+    ax.set_title(title)
+    if filename is not None:
+        figure.savefig(filename)
+    return figure
+
+
+def render_batch(models: list, directory: str, n_workers: int = None, fmt: str = 'png', names: list = None):
+    '''
+    Renders the results of many models to image files, spread across worker processes.
+    :param models: list, MonodModel instances with results
+    :param directory: str, output directory, created if needed
+    :param n_workers: int, number of worker processes, 1 renders in the current process, None uses all CPUs
+    :param fmt: str, image format, e.g. 'png', 'svg' or 'pdf'
+    :param names: list, file names without extension, default Results_<index>
+    :return: list, paths of the written files
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    names = names if names is not None else [f'Results_{i}' for i in range(len(models))]
+    filenames = [os.path.join(directory, f'{name}.{fmt}') for name in names]
+
+    if n_workers == 1:
+        return [_render_model(model, filename) for model, filename in zip(models, filenames)]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_render_model, models, filenames, chunksize=max(1, len(models) // 64)))
+
+
+def _render_model(model, filename: str):
+    '''
+    Renders the results of one model, also inside worker processes of render_batch().
+    '''
+    model.plot_results(show=False, filename=filename)
+    return filename
+
+
+def _fit_start(model, start_id: int, param_list, method: str, offline_values, weights):
+    '''
+    Runs one local fit of MonodModel.fit_model_multistart(), also inside worker processes.
+    '''
+    start_time = time.perf_counter()
+    params = model.fit_model(list(param_list), method=method, offline_values=offline_values, weights=weights,
+                             verbose=False)
+    optimum = dict(zip(FIT_PARAMETERS, params))
+    optimum.update(model.var_FitResult)
+    optimum.update({'start': start_id, 'wall_time': time.perf_counter() - start_time})
+    return optimum
+
+
+def _monod_log_posterior(theta, S0, X0, P0, duration: int, u0, sample_idx, measured, sigma):
+    '''
+    Gaussian log-likelihood of offline samples plus a uniform prior on FIT_BOUNDS for many parameter sets at once.
+    :param theta: np.ndarray of shape (n, 4), parameter sets [umax, Ks, Yx, k1]
+    :param sample_idx: np.ndarray, sampling hours of the rows of measured
+    :param measured: np.ndarray of shape (len(sample_idx), 3), measured X, S, P (NaN values are ignored)
+    :param sigma: np.ndarray of shape (3,), standard deviation of the measurement noise of X, S, P
+    :return: np.ndarray of shape (n,), log posterior up to a constant (-inf outside FIT_BOUNDS)
+    '''
+    log_prob = np.full(len(theta), -np.inf)
+    inside = np.all((theta >= FIT_BOUNDS[0]) & (theta <= FIT_BOUNDS[1]), axis=1)
+    if np.any(inside):
+        umax, Ks, Yx, k1 = theta[inside].T
+        ensemble = calculate_monod_ensemble(umax, Ks, Yx, k1, S0, X0, P0, duration=duration, u0=u0)
+        residuals = (ensemble[:, :3, sample_idx].transpose(0, 2, 1) - measured) / sigma
+        log_prob[inside] = -0.5 * np.nansum(residuals ** 2, axis=(1, 2))
+    return log_prob
+
+
+def _run_chain(seed_sequence, start, n_steps: int, stretch: float, posterior_args: tuple):
+    '''
+    Runs one chain of MonodModel.sample_posterior(), also inside worker processes.
+    Affine-invariant ensemble sampler with stretch moves (Goodman & Weare 2010): the walkers are split in two halves
+    and each half moves relative to random walkers of the other half, so every half step needs one vectorized
+    simulation of n_walkers / 2 proposals.
+    '''
+    start_time = time.perf_counter()
+    rng = np.random.default_rng(seed_sequence)
+    position = np.array(start, dtype=float)
+    n_walkers, n_dim = position.shape
+    log_prob = _monod_log_posterior(position, *posterior_args)
+    halves = np.arange(n_walkers).reshape(2, -1)
+    chain = np.empty((n_steps, n_walkers, n_dim))
+    chain_log_prob = np.empty((n_steps, n_walkers))
+    accepted = 0
+
+    for step in range(n_steps):
+        for moving, partners in (halves, halves[::-1]):
+            z = ((stretch - 1) * rng.random(len(moving)) + 1) ** 2 / stretch
+            anchor = position[rng.choice(partners, len(moving))]
+            proposal = anchor + z[:, None] * (position[moving] - anchor)
+            proposal_log_prob = _monod_log_posterior(proposal, *posterior_args)
+            accept = np.log(rng.random(len(moving))) < ((n_dim - 1) * np.log(z) + proposal_log_prob
+                                                        - log_prob[moving])
+            position[moving[accept]] = proposal[accept]
+            log_prob[moving[accept]] = proposal_log_prob[accept]
+            accepted += np.count_nonzero(accept)
+        chain[step] = position
+        chain_log_prob[step] = log_prob
+
+    return {'chain': chain, 'log_prob': chain_log_prob, 'acceptance': accepted / (n_steps * n_walkers),
+            'wall_time': time.perf_counter() - start_time}
+
+
+def autocorrelation_time(chain, window: float = 5):
+    '''
+    Integrated autocorrelation time of MCMC samples, with the autocorrelation averaged over all walkers and
+    Sokal's automatic window (the sum is truncated at the first lag M >= window * tau(M)).
+    :param chain: np.ndarray of shape (n_steps, n_walkers) or (n_steps, n_walkers, n_parameters)
+    :return: float or np.ndarray of shape (n_parameters,), autocorrelation time in steps
+    '''
+    chain = np.asarray(chain, dtype=float)
+    n_steps = len(chain)
+    deviation = chain - chain.mean(axis=0)
+    n_fft = 2 ** int(np.ceil(np.log2(2 * n_steps)))
+    spectrum = np.fft.rfft(deviation, n=n_fft, axis=0)
+    autocovariance = np.fft.irfft(spectrum * np.conj(spectrum), n=n_fft, axis=0)[:n_steps]
+    autocorrelation = (autocovariance / np.where(autocovariance[0] > 0, autocovariance[0], 1)).mean(axis=1)
+    tau = 2 * np.cumsum(autocorrelation, axis=0) - 1
+    lags = np.arange(n_steps).reshape((-1,) + (1,) * (tau.ndim - 1))
+    cut = np.argmax(lags >= window * tau, axis=0)
+    cut = np.where(np.any(lags >= window * tau, axis=0), cut, n_steps - 1)
+    return np.take_along_axis(tau, np.expand_dims(cut, 0), axis=0)[0]
+
+
+def _maximize_batched(evaluate, low, high, start=None, method: str = 'cmaes', population: int = None,
+                      max_iter: int = 100, tol: float = 1e-6, seed: int = None):
+    '''
+    Maximizes evaluate() within the box [low, high] with one call per iteration for the whole candidate population,
+    used by MonodModel.optimize_conditions(). Candidates are ranked feasible first (by objective), infeasible ones by
+    their constraint violation. method='cmaes' runs a (mu/mu_w, lambda)-CMA-ES in box coordinates scaled to [0, 1],
+    candidates outside the box are repaired onto it. method='grid' evaluates a regular grid and halves the box
+    around the best candidate every iteration. Both stop when the step size (sigma or grid spacing, scaled to the
+    box) falls below tol.
+    :param evaluate: function, candidates of shape (n, d) -> (objective, violation), each of shape (n,)
+    :return: tuple, best candidate, its objective and violation, history rows (list of dict), converged (bool)
+    '''
+    low, high = np.asarray(low, dtype=float), np.asarray(high, dtype=float)
+    d = len(low)
+    rng = np.random.default_rng(seed)
+    best = {'x': None, 'objective': -np.inf, 'violation': np.inf}
+    history = []
+    evaluations = 0
+
+    def rank(z):
+        nonlocal evaluations
+        objective, violation = evaluate(low + z * (high - low))
+        evaluations += len(z)
+        order = np.lexsort((-objective, violation))
+        top = order[0]
+        if (violation[top], -objective[top]) < (best['violation'], -best['objective']):
+            best.update(x=low + z[top] * (high - low), objective=float(objective[top]),
+                        violation=float(violation[top]))
+        return order
+
+    def record(iteration, step):
+        history.append({'iteration': iteration, 'evaluations': evaluations, 'objective': best['objective'],
+                        'violation': best['violation'], 'step': step,
+                        **{f'x{i}': value for i, value in enumerate(best['x'])}})
+
+    mean = np.full(d, 0.5) if start is None else np.clip((np.asarray(start, dtype=float) - low) / (high - low), 0, 1)
+    converged = False
+    if method == 'cmaes':
+        # larger than the textbook 4 + 3 ln(d), the hourly steps make the objective rugged
+        lam = population or max(16, 4 + int(3 * np.log(d)))
+        mu = lam // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        weights /= weights.sum()
+        mueff = 1 / np.sum(weights ** 2)
+        cc = (4 + mueff / d) / (d + 4 + 2 * mueff / d)
+        cs = (mueff + 2) / (d + mueff + 5)
+        c1 = 2 / ((d + 1.3) ** 2 + mueff)
+        cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((d + 2) ** 2 + mueff))
+        damps = 1 + 2 * max(0, np.sqrt((mueff - 1) / (d + 1)) - 1) + cs
+        chi_n = np.sqrt(d) * (1 - 1 / (4 * d) + 1 / (21 * d ** 2))
+        sigma, C, pc, ps = 0.3, np.eye(d), np.zeros(d), np.zeros(d)
+
+        for iteration in range(max_iter):
+            eigenvalues, B = np.linalg.eigh(C)
+            D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+            z = np.clip(mean + sigma * (rng.standard_normal((lam, d)) * D) @ B.T, 0, 1)
+            y = (z - mean) / sigma
+            selected = y[rank(z)[:mu]]
+            y_w = weights @ selected
+            mean = mean + sigma * y_w
+
+            ps = (1 - cs) * ps + np.sqrt(cs * (2 - cs) * mueff) * (B @ ((B.T @ y_w) / D))
+            hsig = np.linalg.norm(ps) / np.sqrt(1 - (1 - cs) ** (2 * (iteration + 1))) / chi_n < 1.4 + 2 / (d + 1)
+            pc = (1 - cc) * pc + hsig * np.sqrt(cc * (2 - cc) * mueff) * y_w
+            C = ((1 - c1 - cmu) * C + c1 * (np.outer(pc, pc) + (1 - hsig) * cc * (2 - cc) * C)
+                 + cmu * (selected.T * weights) @ selected)
+            sigma *= np.exp(cs / damps * (np.linalg.norm(ps) / chi_n - 1))
+
+            step = sigma * D.max()
+            record(iteration, step)
+            if step < tol:
+                converged = True
+                break
+    elif method == 'grid':
+        n_points = max(3, int(round((population or 16) ** (1 / d))))
+        lower, upper = np.zeros(d), np.ones(d)
+        for iteration in range(max_iter):
+            axes = [np.linspace(a, b, n_points) for a, b in zip(lower, upper)]
+            z = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, d)
+            center = z[rank(z)[0]]
+            half_width = (upper - lower) / 4
+            lower, upper = np.clip(center - half_width, 0, 1), np.clip(center + half_width, 0, 1)
+
+            step = np.max((upper - lower) / (n_points - 1))
+            record(iteration, step)
+            if step < tol:
+                converged = True
+                break
+    else:
+        raise ValueError(f'Unknown optimization method "{method}". Choose "cmaes" or "grid".')
+
+    return best['x'], best['objective'], best['violation'], history, converged
 
 
 class MonodModel:
@@ -25,19 +889,30 @@ class MonodModel:
     __Organism = 'E. coli'                          # Alternatively: 'Pput'
     __OperationMode = 'batch'                       # Alternatively: 'fedbatch', 'continuous'
     __Results = dict()
+    __OperationModes = ('batch', 'fedbatch', 'continuous')
+    __Feed = dict(
+            {
+                    'V0':   1.0,                        # Initial reactor volume [L]
+                    'F':    0.05,                       # Feed rate [L/h] or feed profile [(start [h], F), ...]
+                    'Sf':   100.0,                      # Substrate concentration of the feed [g/L]
+            })
+    __Solvers = ('euler', 'ivp')
+    __SamplingTimes = [0, 2, 4, 6, 8, 20, 23]       # Offline sampling times [h]
+    __TransientAttributes = ('_MonodModel__Solutions', '_MonodModel__ReferenceCache')
 
     def __init__(self):
         # Instance attributes
         self.__Params = dict(
                 {
                         'u0':       0,                            # Initial growth rate [h^-1]
-                        'umax':     round(uniform(0.5, 1.1), 3),  # maximal growth rate [h^-1] (default 0.5 - 1.1)
+                        'umax':     round(uniform(*PARAM_PRIORS['umax']), 3),
+                        # maximal growth rate [h^-1] (default 0.5 - 1.1)
                         'duration': 24,                           # Process Duration [h] as Integer
-                        'Ks':       round(uniform(7, 10), 3),
+                        'Ks':       round(uniform(*PARAM_PRIORS['Ks']), 3),
                         # Monod substrate affinity constant (default 7 - 10) [g/L]
-                        'Yx':       round(uniform(0.4, 0.6), 3),
+                        'Yx':       round(uniform(*PARAM_PRIORS['Yx']), 3),
                         # Yield coefficient for growth on glucose (default 0.4 - 0.6) [g/g]
-                        'k1':       round(uniform(0.05, 0.2), 3),
+                        'k1':       round(uniform(*PARAM_PRIORS['k1']), 3),
                         # Production rate of Product (default 0.05 - 0.2) [# h^-1]
 
                         # sources: https://bionumbers.hms.harvard.edu/bionumber.aspx?id=105318,
@@ -46,18 +921,24 @@ class MonodModel:
         self.__hiddenParams = dict(
                 {
                         'u0':       0,                            # Initial growth rate [h^-1]
-                        'umax':     round(uniform(0.5, 1.1), 3),  # maximal growth rate [h^-1] (default 0.5 - 1.1)
+                        'umax':     round(uniform(*PARAM_PRIORS['umax']), 3),
+                        # maximal growth rate [h^-1] (default 0.5 - 1.1)
                         'duration': 24,                           # Process Duration [h] as Integer
-                        'Ks':       round(uniform(7, 10), 3),
-                        'Yx':       round(uniform(0.4, 0.6), 3),
-                        'k1':       round(uniform(0.05, 0.2), 3),
+                        'Ks':       round(uniform(*PARAM_PRIORS['Ks']), 3),
+                        'Yx':       round(uniform(*PARAM_PRIORS['Yx']), 3),
+                        'k1':       round(uniform(*PARAM_PRIORS['k1']), 3),
                 })
         self.__Conditions = dict(
                 {
-                        'S0': round(uniform(19, 21), 3),  # Initial substrate concentration [g/L]
+                        'S0': round(uniform(*PARAM_PRIORS['S0']), 3),  # Initial substrate concentration [g/L]
                         'P0': 0,  # Initial product concentration [g/L]
-                        'X0': round(uniform(0.05, 0.3), 3)  # Initial biomass concentration [g/L]
+                        'X0': round(uniform(*PARAM_PRIORS['X0']), 3)  # Initial biomass concentration [g/L]
                 })
+        self.var_Feed = dict(self.__Feed)           # Feed settings for 'fedbatch' and 'continuous' operation
+        self.__Solutions = dict()                   # Cached dense solver output for the 'ivp' solver
+        self.__ReferenceCache = None                # Cached hidden trajectory as (key, monod_result)
+        self.var_ReferenceCacheHits = 0
+        self.var_ReferenceCacheMisses = 0
         self.var_ModelingCount = 0
         self.var_ExpCount = 0
         self.__optimal_S = round(uniform(15, 30), 3)
@@ -110,21 +991,30 @@ class MonodModel:
             rS0 = -(rX0 / (Yx / S0))            # Startwert Änderungsrate S
             rP0 = (k1 * u0) * X0                # Startwert Änderungsrate P
         else:
-            rX0 = 0
-            rS0 = 0
-            rP0 = 0                             # TODO: Fedbatch & Konti Ergänzen!
+            F = feed_schedule(self.var_Feed['F'])[1][0]
+            D = F / self.var_Feed['V0']         # Verdünnungsrate
+            rX0 = u0 * X0 - D * X0
+            rS0 = -(u0 * X0 / Yx) + D * (self.var_Feed['Sf'] - S0)
+            rP0 = (k1 * u0) * X0 - D * self.var_Conditions['P0']
 
         start_params = {
                 'rX0': rX0,
                 'rS0': rS0,
                 'rP0': rP0
                         }
+        if self.var_OperationMode == 'fedbatch':
+            start_params['rV0'] = F             # Startwert Änderungsrate V
 
         return start_params
 
-    def calculate_monod(self, hidden_params=False):
+    def calculate_monod(self, hidden_params=False, solver: str = 'euler', rtol: float = 1e-6):
         '''
         Calculates monod kinetics for current model instance.
+        The default solver 'euler' steps the model in fixed 1 h increments, solver 'ivp' integrates the kinetics
+        adaptively to the tolerance rtol and reports the results at the same hourly time points.
+        'fedbatch' and 'continuous' operation is always integrated adaptively with the feed in var_Feed, see
+        simulate_fed_ensemble(), the result then also contains the volume V.
+        Raises ValueError if the solver is unknown and AttributeError if the mode of operation is unsupported.
             Output:
                 monod_result: dict, Result of kinetics (X, S, P, µ, rX, rS, rP) as Lists
 
@@ -140,68 +1030,109 @@ class MonodModel:
         >>> max(monod_result['u']) <= TestModelBatch.var_Params['umax']
         True
         '''
-        # Get start parameters
-        params = self.get_start_params(hidden_params)
-        rX, rS, rP = [params['rX0']], [params['rS0']], [params['rP0']]
         if hidden_params:
-            duration, umax, Ks, = self.var_Params['duration'], self.__hiddenParams['umax'], self.__hiddenParams['Ks']
-            Yx, k1, u = self.__hiddenParams['Yx'], self.__hiddenParams['k1'], [self.__hiddenParams['u0']]
+            params = self.__hiddenParams
         else:
-            duration, umax, Ks,  = self.var_Params['duration'], self.var_Params['umax'], self.var_Params['Ks']
-            Yx, k1, u = self.var_Params['Yx'], self.var_Params['k1'], [self.var_Params['u0']]
-        S, P, X = [self.var_Conditions['S0']], [self.var_Conditions['P0']], [self.var_Conditions['X0']]
-
-        for j in range(1, duration):
-            new_u = umax * S[j - 1] / (Ks + S[j - 1])       # Change of µ
-            if new_u >= 0:
-                u.append(new_u)
-            else:
-                u.append(0)
-
-            new_rX = u[j - 1] * X[j - 1]                    # Derivative of Biomass
-            if new_rX >= 0:
-                rX.append(new_rX)
-            else:
-                rX.append(0)
-            X.append(X[j - 1] + rX[j])                      # New [Biomass]
+            params = self.var_Params
+
+        self.__check_operation_mode()
+        if self.var_OperationMode != 'batch':
+            fed = self.simulate_feed_profiles([self.var_Feed['F']], hidden_params, rtol=rtol)
+            X, S, P, V = fed['y'][0]
+            u = params['umax'] * S / (params['Ks'] + S)
+            rX = u * X
+            monod_result = {
+                    'X': X.tolist(),
+                    'S': S.tolist(),
+                    'P': P.tolist(),
+                    'u': u.tolist(),
+                    'rX': rX.tolist(),
+                    'rS': (-rX / params['Yx']).tolist(),
+                    'rP': (params['k1'] * rX).tolist(),
+                    'V': V.tolist()
+                    }
+        elif solver == 'euler':
+            run = calculate_monod_run(params['umax'], params['Ks'], params['Yx'], params['k1'],
+                                      self.var_Conditions['S0'], self.var_Conditions['X0'], self.var_Conditions['P0'],
+                                      duration=self.var_Params['duration'], u0=params['u0'])
+            monod_result = dict(zip(MONOD_VARIABLES, run))
+        elif solver == 'ivp':
+            time = np.arange(self.var_Params['duration'])
+            X, S, P = self.get_solution(hidden_params, rtol).sol(time)
+            S = np.maximum(S, 0)
+            u = params['umax'] * S / (params['Ks'] + S)
+            rX = u * X
+            monod_result = {
+                    'X': X.tolist(),
+                    'S': S.tolist(),
+                    'P': P.tolist(),
+                    'u': u.tolist(),
+                    'rX': rX.tolist(),
+                    'rS': (-rX / params['Yx']).tolist(),
+                    'rP': (params['k1'] * rX).tolist()
+                    }
+        else:
+            raise ValueError(f'Unknown solver "{solver}". Choose one of {self.__Solvers}.')
 
-            new_rS = -(rX[j - 1] / Yx)                      # Derivative of substrate
-            if new_rS <= 0:
-                rS.append(new_rS)
-            else:
-                rS.append(0)
-            new_S = S[j - 1] + rS[j]
-            if new_S < 0:
-                S.append(0)                                 # New [Substrate]
-            else:
-                S.append(new_S)
+        if not hidden_params:
+            self.Results = monod_result
 
-            new_rP = (k1 * u[j]) * X[j]                     # Derivative of product
-            if new_rP >= 0:
-                rP.append(new_rP)
-            else:
-                rP.append(0)
+        return monod_result
 
-            P.append(P[j - 1] + rP[j])                      # New [Product]
+    def simulate_feed_profiles(self, feed_profiles: list, hidden_params=False, t_eval=None, rtol: float = 1e-6):
+        '''
+        Simulates the current model for many feed profiles at once, e.g. to screen feeding strategies.
+        Operation mode, V0 and Sf are taken from the model, see simulate_fed_ensemble(), a 'batch' model is simulated
+        as 'fedbatch'. Raises AttributeError if the mode of operation is unsupported.
+        :param feed_profiles: list, one feed profile per run, a feed rate F [L/h] or [(start [h], F), ...]
+        :param hidden_params: bool, simulate with the hidden parameters
+        :param t_eval: list, output times [h], default hourly over the process duration
+        :return: dict, see simulate_fed_ensemble()
+        '''
+        self.__check_operation_mode()
+        params = self.__hiddenParams if hidden_params else self.var_Params
+        mode = 'continuous' if self.var_OperationMode == 'continuous' else 'fedbatch'
+        return simulate_fed_ensemble(params['umax'], params['Ks'], params['Yx'], params['k1'],
+                                     self.var_Conditions['S0'], self.var_Conditions['X0'], feed_profiles,
+                                     P0=self.var_Conditions['P0'], V0=self.var_Feed['V0'], Sf=self.var_Feed['Sf'],
+                                     duration=self.var_Params['duration'], mode=mode, t_eval=t_eval, rtol=rtol,
+                                     atol=rtol * 1e-2)
+
+    def get_solution(self, hidden_params=False, rtol: float = 1e-6):
+        '''
+        Returns the adaptive solver solution of the current model instance with dense output.
+        The solution is cached and only recomputed if parameters, conditions or tolerance have changed.
+            Output:
+                solution: OdeResult, solution.sol(t) returns [X, S, P] at arbitrary times
+        '''
+        if hidden_params:
+            params = self.__hiddenParams
+        else:
+            params = self.var_Params
+        key = (params['umax'], params['Ks'], params['Yx'], params['k1'], self.var_Conditions['S0'],
+               self.var_Conditions['X0'], self.var_Conditions['P0'], self.var_Params['duration'], rtol)
 
-        monod_result = {
-                'X': X,
-                'S': S,
-                'P': P,
-                'u': u,
-                'rX': rX,
-                'rS': rS,
-                'rP': rP
-                }
+        cached = self.__Solutions.get(hidden_params)
+        if cached is None or cached[0] != key:
+            solution = solve_monod(*key[:-1], rtol=rtol, atol=rtol * 1e-3)
+            self.__Solutions[hidden_params] = (key, solution)
+        return self.__Solutions[hidden_params][1]
 
-        if not hidden_params:
-            self.Results = monod_result
+    def sample_results(self, sampling_times, hidden_params=False, rtol: float = 1e-6):
+        '''
+        Evaluates X, S and P at arbitrary sampling times [h] from the dense adaptive solver output.
+        :param sampling_times: list, times in h, e.g. [0, 2.5, 4, 20]
+        :return: pd.DataFrame, indexed by sampling time
+        '''
+        import pandas as pd
 
-        return monod_result
+        X, S, P = self.get_solution(hidden_params, rtol).sol(np.asarray(sampling_times, dtype=float))
+        return pd.DataFrame({'X': X, 'S': np.maximum(S, 0), 'P': P}, index=sampling_times)
 
-    def plot_results(self, offline_results: pd.DataFrame = None):
+    def plot_results(self, offline_results: 'pd.DataFrame' = None, show: bool = True, filename: str = None):
         '''
         Returns plot of current model instance results (X,S,P vs. Time).
+        With show=False the figure is rendered headless without pyplot, see render_results().
         Raises AttributeError if no results are stored inside the model when the method is called.
 
         >>> TestModelBatch = Monod_Model()
@@ -215,6 +1146,10 @@ class MonodModel:
 
         time = range(1, self.var_Params['duration']+1)
         X, S, P = self.Results['X'], self.Results['S'], self.Results['P']
+        if not show:
+            return render_results(time, self.Results, offline_values=offline_results, title=self.__Description,
+                                  filename=filename)
+        import matplotlib.pyplot as plt
 
         plt.plot(time, X, 'r', time, S, 'g', time, P, 'b')
         if offline_results is not None:
@@ -233,7 +1168,9 @@ class MonodModel:
     def calc_new_mu(self, step: int):
         '''
         Calculates new µ value depending on different inhibition terms.
-        Raises AttributeError if mode of operation or inhibition term is unsupported.
+        The substrate concentration of the previous step is taken from the stored results, before the first
+        calculation only step 1 (from S0) is available. Raises AttributeError if mode of operation or inhibition term
+        is unsupported.
 
         >>> TestModelBatch = Monod_Model()
         >>> TestModelBatch.var_OperationMode = 'test'
@@ -242,23 +1179,35 @@ class MonodModel:
         ...
         AttributeError: Unsupported mode of operation. Check to see if Model.var_OperationMode is one of "batch", "fedbatch", or "continuous".
         '''
-        self.var_Paramsparams = self.get_start_params()
-        duration, umax, Ks,  = self.var_Params['duration'], self.var_Params['umax'], self.var_Params['Ks']
-        # Yx, k1, u = self.var_Params['Yx'], self.var_Params['k1'], [self.var_Params['u0']]
-        # TODO: Anpassen auf iteratives Aufrufen der Monod_Calculation
-        S, P, X = [self.var_Conditions['S0']], [self.var_Conditions['P0']], [self.var_Conditions['X0']]
-
-        if self.var_OperationMode == 'batch':
-            new_u = umax * S[step - 1] / (Ks + S[step - 1])
-        elif self.var_OperationMode == 'fedbatch':
-            new_u = 0
-        elif self.var_OperationMode == 'continuous':
-            new_u = 0
+        umax, Ks = self.var_Params['umax'], self.var_Params['Ks']
+        if hasattr(self, 'Results'):
+            S = self.Results['S']
         else:
+            S = [self.var_Conditions['S0']]
+
+        self.__check_operation_mode()
+        # feed and dilution only enter the mass balances, µ follows the monod kinetics in every mode
+        new_u = umax * S[step - 1] / (Ks + S[step - 1])
+
+        return max(new_u, 0)
+
+    def __check_operation_mode(self):
+        '''
+        Raises AttributeError if var_OperationMode is not one of the supported modes of operation.
+        '''
+        if self.var_OperationMode not in self.__OperationModes:
             raise AttributeError('Unsupported mode of operation. Check to see if Model.var_OperationMode is one of '
                                  '"batch", "fedbatch", or "continuous".')
 
-        return new_u
+    def get_stepper(self, hidden_params=False, dt: float = 1.0):
+        '''
+        Returns a MonodStepper that advances the process of this model step by step from its starting conditions.
+        :param hidden_params: bool, step with the hidden parameters
+        :param dt: float, step size [h]
+        :return: MonodStepper
+        '''
+        params = self.__hiddenParams if hidden_params else self.var_Params
+        return MonodStepper(params, self.var_Conditions, mode=self.var_OperationMode, feed=self.var_Feed, dt=dt)
 
     def results_to_csv(self, experiments_ID: int = 0):
         '''
@@ -266,6 +1215,8 @@ class MonodModel:
         :param experiments_ID:
         :return:
         '''
+        import pandas as pd
+
         pathname = os.path.relpath('model_results')
         if not os.path.isdir(pathname):
             os.mkdir(pathname)
@@ -288,34 +1239,91 @@ class MonodModel:
         path_file_name = os.path.join(pathname, filename)
 
         with open(path_file_name, 'w') as outfile:
-            json.dump(self, outfile, indent=4, default=lambda o: o.__dict__)
+            json.dump(self, outfile, indent=4, default=self.__json_default)
 
         return path_file_name
 
-    def from_json(self, json_path: str):
+    def __json_default(self, o):
+        '''
+        Serializes the model without transient attributes like cached solver output.
+        '''
+        if o is self:
+            return {key: value for key, value in self.__dict__.items() if key not in self.__TransientAttributes}
+        return o.__dict__
+
+    @classmethod
+    def from_json(cls, json_path: str):
         '''
         Deserializes model from .json.
         '''
         with open(json_path, 'r') as file:
             readout = json.load(file)
-            new_model = MonodModel()
-            new_model.var_Params = readout['var_Params']
-            new_model.var_Conditions = readout['var_Conditions']
-            new_model.var_Organism = readout['var_Organism']
-            new_model.var_OperationMode = readout['var_OperationMode']
-            new_model.Results = readout['Results']
-            new_model.__Description = readout['_MonodModel__Description']
+        return cls.__from_state(readout)
+
+    def get_state(self):
+        '''
+        Returns the serializable model state (parameters, conditions, counters, ...) without results.
+            Output:
+                state: dict
+        '''
+        state = self.__json_default(self)
+        state.pop('Results', None)
+        return json.loads(json.dumps(state, default=self.__json_default))
+
+    @classmethod
+    def __from_state(cls, state: dict, results: dict = None):
+        '''
+        Rebuilds a model from a serialized state without drawing new random parameters.
+        '''
+        new_model = cls.__new__(cls)
+        new_model.var_Feed = dict(cls.__Feed)
+        new_model.__Solutions = dict()
+        new_model.__ReferenceCache = None
+        new_model.var_ReferenceCacheHits = 0
+        new_model.var_ReferenceCacheMisses = 0
+        new_model.__dict__.update({key: value for key, value in state.items()
+                                   if key not in cls.__TransientAttributes})
+        new_model.__Params, new_model.__Conditions = new_model.var_Params, new_model.var_Conditions
+        if results is not None:
+            new_model.Results = results
         return new_model
 
-    def Make_SubstrateGrowthExp(self, substrate_values: list, experiments_ID: int):
+    def to_archive(self, archive_path: str):
+        '''
+        Appends the model and its results to a binary archive, see ResultArchive.
+        :param archive_path: str, archive path without file extension
+        :return: int, index of the model in the archive
+        '''
+        return ResultArchive(archive_path).append([self])[0]
+
+    @classmethod
+    def from_archive(cls, archive_path: str, index: int):
         '''
+        Loads a single model from a binary archive, only its results are read from the memory-mapped data file.
+        :param archive_path: str, archive path without file extension, or a ResultArchive
+        :param index: int, index of the model in the archive
+        :return: MonodModel
+        '''
+        archive = archive_path if isinstance(archive_path, ResultArchive) else ResultArchive(archive_path)
+        results = archive.results(index)
+        return cls.__from_state(archive.state(index),
+                                {name: results[i].tolist() for i, name in enumerate(archive.variables)})
 
+    def Make_SubstrateGrowthExp(self, substrate_values: list, experiments_ID: int, batch: bool = False,
+                                n_workers: int = 1):
+        '''
+        Runs one experiment per initial substrate concentration and plots, serializes and writes each result.
+        With batch=True all experiments are simulated in one call without plotting, see run_substrate_sweep().
         '''
+        if batch:
+            return self.run_substrate_sweep(substrate_values, experiments_ID, n_workers=n_workers)
+
         ncols = 2
         nrows = ceil(len(substrate_values)/ncols)
         for value in substrate_values:
             assert type(value) == int or float, 'Substrate value is not a number!'
             self.var_Conditions['S0'] = value
+            self.clear_reference_cache()
             self.calculate_monod()
             plt = self.plot_results()
             self.to_json(suffix=str(experiments_ID))
@@ -324,15 +1332,69 @@ class MonodModel:
 
         return plt
 
-    def offline_samples(self, experiments_ID: int = 0):
+    def run_substrate_sweep(self, substrate_values: list, experiments_ID: int = 0, n_workers: int = 1,
+                            write_csv: bool = True):
+        '''
+        Simulates all initial substrate concentrations in one vectorized call, without plotting, and writes a single
+        consolidated table to dir /model_results. The current conditions of the model stay unchanged.
+        :param substrate_values: list, initial substrate concentrations S0 [g/L]
+        :param experiments_ID: int
+        :param n_workers: int, number of worker processes the sweep is split across, None uses all CPUs
+        :param write_csv: bool, write the table to .csv
+        :return: pd.DataFrame, columns experiment_ID, S0, time, X, S, P, u (one row per S0 and hour)
+        '''
+        import pandas as pd
+
+        substrate_values = np.asarray(substrate_values, dtype=float)
+        args = (self.var_Params['umax'], self.var_Params['Ks'], self.var_Params['Yx'], self.var_Params['k1'])
+        kwargs = dict(X0=self.var_Conditions['X0'], P0=self.var_Conditions['P0'],
+                      duration=self.var_Params['duration'], u0=self.var_Params['u0'])
+
+        if n_workers == 1:
+            ensemble = calculate_monod_ensemble(*args, substrate_values, **kwargs)
+        else:
+            n_chunks = n_workers or os.cpu_count()
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                chunks = [executor.submit(calculate_monod_ensemble, *args, chunk, **kwargs)
+                          for chunk in np.array_split(substrate_values, n_chunks) if len(chunk)]
+                ensemble = np.concatenate([chunk.result() for chunk in chunks])
+
+        n_runs, duration = len(substrate_values), self.var_Params['duration']
+        table = pd.DataFrame({
+                'experiment_ID': experiments_ID,
+                'S0': np.repeat(substrate_values, duration),
+                'time': np.tile(np.arange(duration), n_runs),
+                })
+        for var in ['X', 'S', 'P', 'u']:
+            table[var] = ensemble[:, MONOD_VARIABLES.index(var)].ravel()
+        self.var_ExpCount += n_runs
+
+        if write_csv:
+            pathname = os.path.relpath('model_results')
+            if not os.path.isdir(pathname):
+                os.mkdir(pathname)
+            table.to_csv(os.path.join(pathname, f'SubstrateSweep_{experiments_ID}_{self.__ModelName}.csv'),
+                         index=False)
+
+        return table
+
+    def offline_samples(self, experiments_ID: int = 0, solver: str = 'euler', show: bool = True,
+                        figure_path: str = None, sampling_times: list = None):
         '''
         Simulates manual sampling of process with samples at discrete timesteps.
+        With solver='ivp' the samples are taken from the dense adaptive solver output. With show=False the samples
+        are plotted headless to figure_path (if given) instead of pyplot. sampling_times replaces the default
+        sampling hours, e.g. by a design from design_sampling_times().
         :return:
         '''
+        import pandas as pd
 
-        results = pd.DataFrame(self.calculate_monod(hidden_params=True))
-        sampling_times = [0, 2, 4, 6, 8, 20, 23]
-        offline_values = results.iloc[sampling_times][['X', 'S', 'P']]
+        sampling_times = self.__SamplingTimes if sampling_times is None else list(sampling_times)
+        if solver == 'ivp':
+            offline_values = self.sample_results(sampling_times, hidden_params=True)
+        else:
+            results = pd.DataFrame(self.calculate_monod(hidden_params=True, solver=solver))
+            offline_values = results.iloc[sampling_times][['X', 'S', 'P']]
 
         pathname = os.path.relpath('offline_samples')
         if not os.path.isdir(pathname):
@@ -348,6 +1410,11 @@ class MonodModel:
 
         time = offline_values.index
         X, S, P = offline_values['X'], offline_values['S'], offline_values['P']
+        if not show:
+            render_results(offline_values=offline_values, offline_time=time, title=self.__Description,
+                           filename=figure_path)
+            return filename
+        import matplotlib.pyplot as plt
 
         plt.plot(time, X, 'r', time, S, 'g', time, P, 'b', linestyle='', marker='X')
         plt.legend(['Biomass [g/L]', 'Substrate [g/L]', 'Product [g/L]'])
@@ -359,12 +1426,141 @@ class MonodModel:
 
         return filename
 
+    def get_reference_results(self):
+        '''
+        Returns the hidden "ground truth" trajectory for the current conditions.
+        The trajectory is cached and only recalculated if hidden parameters or conditions have changed, hits and
+        misses are counted in var_ReferenceCacheHits and var_ReferenceCacheMisses. The returned lists must not be
+        modified.
+            Output:
+                monod_result: dict, Result of hidden kinetics (X, S, P, µ, rX, rS, rP) as Lists
+        '''
+        key = (tuple(self.__hiddenParams.values()), tuple(self.var_Conditions.items()), self.var_Params['duration'])
+        if self.__ReferenceCache is not None and self.__ReferenceCache[0] == key:
+            self.var_ReferenceCacheHits += 1
+        else:
+            self.var_ReferenceCacheMisses += 1
+            self.__ReferenceCache = (key, self.calculate_monod(hidden_params=True))
+        return self.__ReferenceCache[1]
+
+    def clear_reference_cache(self):
+        '''
+        Discards the cached hidden trajectory, it is recalculated on the next call of get_reference_results().
+        '''
+        self.__ReferenceCache = None
+
+    def sample_campaigns(self, n_campaigns: int, sampling_times=None, noise='absolute', sigma=0.1,
+                         rng: np.random.Generator = None, filename: str = None, solver: str = 'euler'):
+        '''
+        Simulates many noisy offline sampling campaigns of the hidden process in one array operation.
+        All campaigns are drawn from a single reference trajectory: the cached hidden trajectory with solver='euler'
+        (whole hours only), the dense adaptive solver output with solver='ivp'. Negative samples are set to NaN like
+        in offline_samples(). Raises ValueError for unknown noise models or sampling times between whole hours.
+        :param n_campaigns: int, number of sampling campaigns
+        :param sampling_times: list, sampling times [h] shared by all campaigns, or array of shape
+            (n_campaigns, n_samples) with one schedule per campaign, default as in offline_samples()
+        :param noise: str or callable, 'absolute' (normal noise with standard deviation sigma), 'relative' (standard
+            deviation sigma times the true value) or a function noise(values, rng) returning the noise
+        :param sigma: float or list, noise level, optionally per variable [X, S, P]
+        :param rng: np.random.Generator, source of the noise, e.g. np.random.default_rng(42)
+        :param filename: str, writes all campaigns to one .npz or .csv (long format) file
+        :param solver: str, 'euler' or 'ivp'
+        :return: tuple, sampling times of shape (n_campaigns, n_samples) and samples of shape
+            (n_campaigns, n_samples, 3) with the variables X, S, P
+        '''
+        import pandas as pd
+
+        rng = np.random.default_rng() if rng is None else rng
+        sampling_times = self.__SamplingTimes if sampling_times is None else sampling_times
+        times = np.broadcast_to(np.asarray(sampling_times, dtype=float),
+                                (n_campaigns, np.shape(sampling_times)[-1]))
+
+        unique_times, index = np.unique(times, return_inverse=True)
+        if solver == 'ivp':
+            true_values = self.get_solution(hidden_params=True).sol(unique_times)
+            true_values[1] = np.maximum(true_values[1], 0)
+        else:
+            if np.any(unique_times != np.round(unique_times)) or np.any(unique_times >= self.var_Params['duration']):
+                raise ValueError(f'Sampling times must be whole hours between 0 and {self.var_Params["duration"] - 1}, '
+                                 f'use solver="ivp" for arbitrary times.')
+            reference = self.get_reference_results()
+            true_values = np.array([reference['X'], reference['S'], reference['P']])[:, unique_times.astype(int)]
+        true_values = true_values.T[index.reshape(times.shape)]
+
+        if noise == 'absolute':
+            samples = true_values + rng.normal(0, 1, true_values.shape) * np.asarray(sigma)
+        elif noise == 'relative':
+            samples = true_values + rng.normal(0, 1, true_values.shape) * np.asarray(sigma) * np.abs(true_values)
+        elif callable(noise):
+            samples = true_values + noise(true_values, rng)
+        else:
+            raise ValueError(f'Unknown noise model "{noise}". Choose "absolute", "relative" or a function.')
+        samples[samples < 0] = np.nan
+
+        if filename is not None:
+            if filename.endswith('.npz'):
+                np.savez_compressed(filename, times=times, samples=samples)
+            else:
+                pd.DataFrame({
+                        'campaign': np.repeat(np.arange(n_campaigns), times.shape[1]),
+                        'time': times.ravel(),
+                        'X': samples[:, :, 0].ravel(),
+                        'S': samples[:, :, 1].ravel(),
+                        'P': samples[:, :, 2].ravel(),
+                        }).to_csv(filename, index=False)
+
+        return times, samples
+
+    def propagate_uncertainty(self, n_samples: int, priors: dict = None, **kwargs):
+        '''
+        Distribution of the process trajectories over the parameter and starting condition priors, with the duration,
+        P0 and u0 of this model. See propagate_uncertainty() for the priors, further arguments and the result.
+        To fix a parameter at the current model value, pass it as a number,
+        e.g. priors={'S0': model.var_Conditions['S0']}.
+        :param n_samples: int, number of Monte Carlo samples
+        :param priors: dict, overrides PARAM_PRIORS per parameter
+        :return: dict, running statistics per variable and time point
+        '''
+        return propagate_uncertainty(n_samples, priors, duration=self.var_Params['duration'],
+                                     P0=self.var_Conditions['P0'], u0=self.var_Params['u0'], **kwargs)
+
+    def design_sampling_times(self, k: int = 7, candidates=None, sigma=0.1, hidden_params=False,
+                              method: str = 'exchange'):
+        '''
+        D-optimal offline sampling schedule for the current parameter estimate (or the hidden parameters).
+        One sensitivity simulation gives the Fisher information of every candidate hour, the schedule search is done
+        by d_optimal_schedule() without further simulations. Raises ValueError outside batch operation.
+        :param k: int, number of samples
+        :param candidates: list, candidate sampling hours, default all hours of the process
+        :param sigma: float or list, noise standard deviation, optionally per variable [X, S, P]
+        :param hidden_params: bool, design for the hidden instead of the current parameters
+        :param method: str, 'exchange', 'exhaustive' or 'auto', see d_optimal_schedule()
+        :return: dict, 'sampling_times': optimal hours (e.g. for offline_samples()), 'log_det': log-determinant of
+            their Fisher information, 'fisher_information': np.ndarray of shape (4, 4) and 'default_log_det':
+            log-determinant for the default sampling times
+        '''
+        if self.var_OperationMode != 'batch':
+            raise ValueError('Sampling design with sensitivities is only available for batch operation.')
+        params = self.__hiddenParams if hidden_params else self.var_Params
+        _, sensitivities = calculate_monod_sensitivities(
+                *(params[name] for name in FIT_PARAMETERS), self.var_Conditions['S0'], self.var_Conditions['X0'],
+                self.var_Conditions['P0'], duration=self.var_Params['duration'], u0=params['u0'])
+        information = fisher_information(sensitivities[0], sigma=sigma)
+        sampling_times, log_det = d_optimal_schedule(information, k, candidates, method)
+        default_times = [t for t in self.__SamplingTimes if t < self.var_Params['duration']]
+        sign, default_log_det = np.linalg.slogdet(information[default_times].sum(axis=0))
+        return {'sampling_times': sampling_times, 'log_det': log_det,
+                'fisher_information': information[sampling_times].sum(axis=0),
+                'default_log_det': float(default_log_det) if sign > 0 else -np.inf}
+
     def load_offline_values(self, experiment_name):
         '''
 
         :param experiments_ID:
         :return:
         '''
+        import pandas as pd
+
         return pd.read_csv(experiment_name, index_col=0)
 
     def get_optimal_X(self):
@@ -377,36 +1573,311 @@ class MonodModel:
         self.__optimal_X = optimal_X
         return optimal_X
 
-    def calc_rmse(self, param_list=None):
+    def optimize_conditions(self, objective='X', bounds: dict = None, constraints: list = None, hidden_params=False,
+                            method: str = 'cmaes', population: int = None, max_iter: int = 100, tol: float = 1e-6,
+                            seed: int = None):
+        '''
+        Searches the starting conditions that maximize the final biomass or product of the process.
+        Every iteration simulates the whole candidate population at once with calculate_monod_ensemble(), the
+        population is driven by a CMA-ES or a refining grid (see _maximize_batched()). Constraints are functions of
+        the candidates that must be <= 0, violated candidates rank behind all feasible ones. The conditions of the
+        model are not changed, use set_conditions() to apply the result.
+        Raises ValueError for unknown objectives, conditions or methods and outside batch operation.
+        :param objective: str or function, 'X' or 'P' at the end of the process, or a function
+            objective(conditions, ensemble) returning one value per candidate to maximize
+        :param bounds: dict, optimized conditions and their ranges, default {'S0': (5, 50), 'X0': (0.01, 1)}, others
+            keep their current value
+        :param constraints: list of functions constraint(conditions, ensemble) returning one value per candidate,
+            e.g. residual substrate of at most 0.5 g/L: lambda conditions, ensemble: ensemble[:, 1, -1] - 0.5
+            (conditions: dict of arrays S0, X0, P0, ensemble: np.ndarray of shape (n, len(MONOD_VARIABLES), duration))
+        :param hidden_params: bool, optimize the hidden instead of the current model
+        :param method: str, 'cmaes' or 'grid'
+        :param population: int, candidates per iteration (default 16, grid: points of the full grid), the hourly
+            substrate depletion makes the objective rugged, larger populations explore it more reliably
+        :param max_iter: int, maximum number of iterations
+        :param tol: float, stop when the step size relative to the bounds falls below tol
+        :param seed: int, seed of the CMA-ES sampling
+        :return: dict, 'conditions': best conditions, 'objective', 'violation' (0 if feasible), 'evaluations',
+            'converged' and 'history': pd.DataFrame with the best candidate after every iteration
         '''
+        import pandas as pd
+
+        if self.var_OperationMode != 'batch':
+            raise ValueError('Optimization of the starting conditions is only available for batch operation.')
+        bounds = {'S0': (5, 50), 'X0': (0.01, 1)} if bounds is None else bounds
+        unknown = set(bounds) - set(self.var_Conditions)
+        if unknown:
+            raise ValueError(f'Unknown conditions {sorted(unknown)}. Choose from {list(self.var_Conditions)}.')
+        if objective in ('X', 'P'):
+            row = MONOD_VARIABLES.index(objective)
+            objective = lambda conditions, ensemble: ensemble[:, row, -1]
+        elif not callable(objective):
+            raise ValueError(f'Unknown objective "{objective}". Choose "X", "P" or a function.')
+        params = self.__hiddenParams if hidden_params else self.var_Params
+        names = list(bounds)
+        low, high = zip(*(bounds[name] for name in names))
+
+        def evaluate(candidates):
+            conditions = {name: np.full(len(candidates), float(value)) for name, value in self.var_Conditions.items()}
+            conditions.update(zip(names, candidates.T))
+            ensemble = calculate_monod_ensemble(*(params[name] for name in FIT_PARAMETERS), conditions['S0'],
+                                                conditions['X0'], conditions['P0'],
+                                                duration=self.var_Params['duration'], u0=params['u0'])
+            violation = sum((np.maximum(constraint(conditions, ensemble), 0) for constraint in constraints or []),
+                            np.zeros(len(candidates)))
+            return objective(conditions, ensemble), violation
+
+        start = [min(max(self.var_Conditions[name], lo), hi) for name, lo, hi in zip(names, low, high)]
+        x, value, violation, history, converged = _maximize_batched(evaluate, low, high, start, method, population,
+                                                                    max_iter, tol, seed)
+        history = pd.DataFrame(history).rename(columns={f'x{i}': name for i, name in enumerate(names)})
+        return {'conditions': dict(zip(names, x.tolist())), 'objective': value, 'violation': violation,
+                'evaluations': int(history['evaluations'].iloc[-1]), 'converged': converged, 'history': history}
 
-        :param offline_values:
-        :return:
+    def calc_rmse(self, param_list=None):
         '''
+        RMSE of X, S and P against the hidden model, the RMSE across the variables averaged over the hours (the
+        'hourly' RMSE of score_offline_sets()).
+        :param param_list: list, optional parameters [umax, Ks, Yx, k1] to set first
+        :return: float
+        '''
+        import sklearn.metrics
+
         if param_list is not None:
             self.set_params(param_list, count=False)
         self.calculate_monod()
         calc_X, calc_S, calc_P = self.Results['X'], self.Results['S'], self.Results['P']
-        right_values = self.calculate_monod(hidden_params=True)
+        right_values = self.get_reference_results()
         real_X, real_S, real_P = right_values['X'], right_values['S'], right_values['P']
 
         rmse = sklearn.metrics.mean_squared_error([calc_X, calc_S, calc_P], [real_X, real_S, real_P], squared=False)
         return rmse
 
-    def fit_model(self, param_list: list):
+    def fit_model(self, param_list: list, method: str = 'minimize', offline_values: 'pd.DataFrame' = None,
+                  weights: dict = None, verbose: bool = True):
         '''
+        Fits the model parameters (umax, Ks, Yx, k1) within FIT_BOUNDS.
+        method='minimize' minimizes calc_rmse() against the hidden model. method='least_squares' fits the weighted
+        residuals of X, S and P with scipy.optimize.least_squares using the analytic sensitivities of
+        calculate_monod_sensitivities(). It fits against offline_values if given (e.g. from load_offline_values(),
+        indexed by sampling hour, NaN values are ignored), else against the hidden model.
+        var_FitResult['rmse'] is the final objective: calc_rmse() for 'minimize', the RMSE of the weighted residuals
+        for 'least_squares'. Only the first is comparable to plot_linear_fit() and score_offline_sets()['hourly'].
+        Raises ValueError if the method is unknown.
+        :param param_list: list, initial guess [umax, Ks, Yx, k1]
+        :param method: str, 'minimize' or 'least_squares'
+        :param offline_values: pd.DataFrame, measured X, S, P (only for method='least_squares')
+        :param weights: dict, residual weights per variable, e.g. {'X': 2, 'S': 1, 'P': [1, 1, 1, 1, 1, 1, 0.5]}
+        :param verbose: bool, print the number of optimization steps
+        :return: list, optimized [umax, Ks, Yx, k1]
+        '''
+        from scipy.optimize import Bounds, minimize
+
+        if method == 'minimize':
+            bounds = Bounds(*FIT_BOUNDS)
+
+            optimizer = minimize(self.calc_rmse, param_list, bounds=bounds)
+            self.var_FitResult = {'rmse': float(optimizer.fun), 'success': bool(optimizer.success),
+                                  'nfev': int(optimizer.nfev)}
+            steps = optimizer.nit
+        elif method == 'least_squares':
+            optimizer = self.__fit_least_squares(param_list, offline_values, weights)
+            self.var_FitResult = {'rmse': float(np.sqrt(np.mean(optimizer.fun ** 2))),
+                                  'success': bool(optimizer.success), 'nfev': int(optimizer.nfev)}
+            steps = optimizer.nfev
+        else:
+            raise ValueError(f'Unknown fitting method "{method}". Choose "minimize" or "least_squares".')
+        if verbose:
+            print(f'Model optimized in {steps} steps.')
 
-        :param param_list:
-        :param offline_values:
-        :return:
+        return [optimizer.x[0], optimizer.x[1], optimizer.x[2], optimizer.x[3]]
+
+    def __fit_least_squares(self, param_list: list, offline_values: 'pd.DataFrame' = None, weights: dict = None):
+        '''
+        Runs scipy.optimize.least_squares on the weighted residuals of X, S and P with analytic Jacobian.
         '''
-        # umax, Ks, Yx, k1
-        bounds = Bounds([0.5, 7, 0.4, 0.05], [1.1, 10, 0.6, 0.2])
+        from scipy.optimize import least_squares
+
+        if self.var_OperationMode != 'batch':
+            raise ValueError('Least-squares fitting with sensitivities is only available for batch operation.')
+        duration = self.var_Params['duration']
+        if offline_values is None:
+            reference = self.get_reference_results()
+            sample_idx = np.arange(duration)
+            measured = np.array([reference['X'], reference['S'], reference['P']]).T
+        else:
+            sample_idx, measured = self.__offline_measurements(offline_values)
+
+        weight = np.ones_like(measured)
+        for i, var in enumerate(['X', 'S', 'P']):
+            if weights is not None and var in weights:
+                weight[:, i] = weights[var]
+        valid = ~np.isnan(measured)
+        weight, measured = weight[valid], measured[valid]
+
+        # residuals and Jacobian are requested separately for the same parameters, simulate only once
+        last = {}
+
+        def simulate(x):
+            if last.get('x') is None or not np.array_equal(last['x'], x):
+                ensemble, sensitivities = calculate_monod_sensitivities(
+                        *x, self.var_Conditions['S0'], self.var_Conditions['X0'], self.var_Conditions['P0'],
+                        duration=duration, u0=self.var_Params['u0'])
+                last['x'] = np.copy(x)
+                last['model'] = ensemble[0, :3, sample_idx][valid]
+                last['jac'] = sensitivities[0][:, :, sample_idx].transpose(2, 0, 1)[valid]
+            return last
+
+        def residuals(x):
+            return weight * (simulate(x)['model'] - measured)
+
+        def jacobian(x):
+            return weight[:, None] * simulate(x)['jac']
+
+        optimizer = least_squares(residuals, param_list, jac=jacobian, bounds=FIT_BOUNDS)
+        self.set_params(list(optimizer.x), count=False)
+        self.calculate_monod()
+        return optimizer
 
-        optimizer = minimize(self.calc_rmse, param_list, bounds=bounds)
-        print(f'Model optimized in {optimizer.nit} steps.')
+    def __offline_measurements(self, offline_values: 'pd.DataFrame'):
+        '''
+        Sampling hours and measured X, S, P of offline values indexed by sampling hour.
+        Raises ValueError if sampling times are not whole hours within the model duration.
+        '''
+        duration = self.var_Params['duration']
+        sample_idx = offline_values.index.to_numpy(dtype=float)
+        if np.any(sample_idx != np.round(sample_idx)) or np.any((sample_idx < 0) | (sample_idx >= duration)):
+            raise ValueError(f'Sampling times must be whole hours between 0 and {duration - 1}.')
+        return sample_idx.astype(int), offline_values[['X', 'S', 'P']].to_numpy(dtype=float)
+
+    def sample_posterior(self, offline_values: 'pd.DataFrame', n_walkers: int = 32, n_steps: int = 2000,
+                         burn_in: int = 500, n_chains: int = 1, n_workers: int = None, sigma=0.1,
+                         param_list: list = None, stretch: float = 2.0, seed: int = None):
+        '''
+        Bayesian estimate of the model parameters (umax, Ks, Yx, k1) given offline samples, e.g. from
+        offline_samples() and load_offline_values(). The likelihood assumes normal measurement noise with standard
+        deviation sigma (offline_samples() uses 0.1 g/L), the prior is uniform within FIT_BOUNDS. Each chain is an
+        affine-invariant ensemble sampler whose walkers are simulated together with calculate_monod_ensemble(),
+        chains run in a process pool with independent random streams. The walkers start in a small ball around
+        param_list. The model parameters are not changed.
+        Raises ValueError outside batch operation, for an odd number or fewer than 8 walkers or if burn_in >= n_steps.
+        :param offline_values: pd.DataFrame, measured X, S, P indexed by sampling hour, NaN values are ignored
+        :param n_walkers: int, walkers per chain
+        :param n_steps: int, steps per chain including burn-in
+        :param burn_in: int, discarded steps at the start of every chain
+        :param n_chains: int, number of independent chains
+        :param n_workers: int, number of worker processes, 1 samples in the current process, None uses all CPUs
+        :param sigma: float or list, noise standard deviation, optionally per variable [X, S, P]
+        :param param_list: list, centre of the starting walkers [umax, Ks, Yx, k1], default the current parameters
+        :param stretch: float, scale parameter a of the stretch move
+        :param seed: int, seed of the random streams of all chains
+        :return: dict, 'samples': np.ndarray of shape (n_chains, n_steps - burn_in, n_walkers, 4), 'log_prob' of
+            shape (n_chains, n_steps - burn_in, n_walkers), 'acceptance': acceptance fraction per chain,
+            'tau': autocorrelation time per parameter [steps], 'ess': effective sample size per parameter,
+            'wall_time' [s], 'ess_per_second' (smallest ESS over the parameters per wall time) and 'summary':
+            pd.DataFrame with posterior mean, standard deviation and 2.5 %, 50 % and 97.5 % quantiles
+        '''
+        import pandas as pd
+
+        if self.var_OperationMode != 'batch':
+            raise ValueError('Posterior sampling is only available for batch operation.')
+        if n_walkers < 2 * len(FIT_PARAMETERS) or n_walkers % 2:
+            raise ValueError(f'n_walkers must be an even number of at least {2 * len(FIT_PARAMETERS)}.')
+        if not 0 <= burn_in < n_steps:
+            raise ValueError('burn_in must be between 0 and n_steps - 1.')
+        start_time = time.perf_counter()
+        sample_idx, measured = self.__offline_measurements(offline_values)
+        posterior_args = (self.var_Conditions['S0'], self.var_Conditions['X0'], self.var_Conditions['P0'],
+                          self.var_Params['duration'], self.var_Params['u0'], sample_idx, measured,
+                          np.broadcast_to(np.asarray(sigma, dtype=float), 3))
+
+        if param_list is None:
+            param_list = [self.var_Params[name] for name in FIT_PARAMETERS]
+        seeds = np.random.SeedSequence(seed).spawn(n_chains)
+        low, high = np.asarray(FIT_BOUNDS[0]), np.asarray(FIT_BOUNDS[1])
+        starts = []
+        for seed_sequence in seeds:
+            ball = np.random.default_rng(seed_sequence.spawn(1)[0]).normal(0, 1e-3, (n_walkers, len(FIT_PARAMETERS)))
+            starts.append(np.clip(np.asarray(param_list) + ball * (high - low), low, high))
+        args = (n_steps, stretch, posterior_args)
+
+        if n_workers == 1:
+            chains = [_run_chain(seed_sequence, start, *args) for seed_sequence, start in zip(seeds, starts)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                chains = list(executor.map(_run_chain, seeds, starts, *([arg] * n_chains for arg in args)))
+
+        samples = np.array([chain['chain'][burn_in:] for chain in chains])
+        wall_time = time.perf_counter() - start_time
+        # autocorrelation averaged over the walkers of all chains
+        tau = autocorrelation_time(np.concatenate(list(samples), axis=1))
+        ess = samples.shape[0] * samples.shape[1] * samples.shape[2] / np.maximum(tau, 1)
+        flat = samples.reshape(-1, len(FIT_PARAMETERS))
+        summary = pd.DataFrame({'mean': flat.mean(axis=0), 'std': flat.std(axis=0),
+                                '2.5%': np.quantile(flat, 0.025, axis=0), '50%': np.median(flat, axis=0),
+                                '97.5%': np.quantile(flat, 0.975, axis=0), 'tau': tau, 'ess': ess},
+                               index=list(FIT_PARAMETERS))
+        return {'samples': samples, 'log_prob': np.array([chain['log_prob'][burn_in:] for chain in chains]),
+                'acceptance': np.array([chain['acceptance'] for chain in chains]), 'tau': tau, 'ess': ess,
+                'wall_time': wall_time, 'ess_per_second': ess.min() / wall_time, 'summary': summary}
+
+    def fit_model_multistart(self, n_starts: int = 8, method: str = 'least_squares',
+                             offline_values: 'pd.DataFrame' = None, weights: dict = None, param_list: list = None,
+                             n_workers: int = None, tol: float = 1e-4, seed: int = None):
+        '''
+        Global parameter fit from several Latin hypercube starting points within FIT_BOUNDS.
+        Local fits (see fit_model()) run in a process pool. The search stops early as soon as a start converges to an
+        RMSE within tol of the best RMSE of the previous starts (i.e. confirms it), pending starts are cancelled then. The model parameters are set
+        to the best optimum found.
+        :param n_starts: int, number of Latin hypercube starting points
+        :param method: str, local fitting method, 'minimize' or 'least_squares'
+        :param offline_values: pd.DataFrame, measured X, S, P (only for method='least_squares')
+        :param weights: dict, residual weights per variable
+        :param param_list: list, optional user guess [umax, Ks, Yx, k1] used as first start
+        :param n_workers: int, number of worker processes, 1 fits in the current process, None uses all CPUs
+        :param tol: float, absolute RMSE tolerance for early stopping, None disables early stopping
+        :param seed: int, seed of the Latin hypercube sampling
+        :return: pd.DataFrame, one row per finished start with the local optimum, its RMSE and wall time [s],
+            sorted by RMSE
+        '''
+        import pandas as pd
+        from scipy.stats import qmc
 
-        return [optimizer.x[0], optimizer.x[1], optimizer.x[2], optimizer.x[3]]
+        starts = qmc.scale(qmc.LatinHypercube(d=len(FIT_PARAMETERS), seed=seed).random(n_starts), *FIT_BOUNDS)
+        if param_list is not None:
+            starts = np.vstack([param_list, starts[:-1]])
+        args = (method, offline_values, weights)
+
+        optima = []
+
+        def converged(optimum):
+            # a start that reaches the best optimum found by the previous starts confirms it, a start that improves on
+            # it by more than tol is a new best that still needs to be confirmed
+            done = (tol is not None and optimum['success'] and len(optima) > 0
+                    and abs(optimum['rmse'] - min(o['rmse'] for o in optima)) <= tol)
+            optima.append(optimum)
+            return done
+
+        if n_workers == 1:
+            for i, start in enumerate(starts):
+                if converged(_fit_start(self, i, start, *args)):
+                    break
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                pending = {executor.submit(_fit_start, self, i, start, *args) for i, start in enumerate(starts)}
+                stop = False
+                while pending and not stop:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        stop = converged(future.result()) or stop
+                for future in pending:
+                    future.cancel()
+                optima.extend(future.result() for future in pending if not future.cancelled())
+
+        optima = pd.DataFrame(optima).sort_values('rmse', ignore_index=True)
+        self.set_params(optima.loc[0, list(FIT_PARAMETERS)].tolist(), count=False)
+        self.calculate_monod()
+        return optima
 
     def set_params(self, param_list: list, count=True):
         '''
@@ -431,6 +1902,7 @@ class MonodModel:
         '''
         self.var_Conditions['S0'] = condition_list[0]
         self.var_Conditions['X0'] = condition_list[1]
+        self.clear_reference_cache()
         if count:
             self.var_ExpCount += 1
 
@@ -443,35 +1915,30 @@ class MonodModel:
         print(f'Model parameters were changed {self.var_ModelingCount} times.\n'
               f'{self.var_ExpCount} Experiments performed.')
 
-    def plot_linear_fit(self, offline_results: pd.DataFrame):
+    def plot_linear_fit(self, offline_results: 'pd.DataFrame', show: bool = True, figure_path: str = None):
         '''
-
-        :param offline_results:
-        :return:
+        Plots the model results against the linearly interpolated offline samples and returns the RMSE.
+        The RMSE is the 'hourly' RMSE of score_offline_sets() (as in calc_rmse()), missing samples (NaN) count as 0.
+        With show=False the figure is rendered headless to figure_path (if given) instead of pyplot.
+        :param offline_results: pd.DataFrame, offline samples indexed by sampling hour with columns X, S, P
+        :return: float, RMSE over X, S and P
         '''
         if not hasattr(self, 'Results'):
             self.calculate_monod()
 
         X, S, P = self.Results['X'], self.Results['S'], self.Results['P']
         time = range(1, self.var_Params['duration'] + 1)
-        plt.plot(time, X, 'r', time, S, 'g', time, P, 'b')
         off_time = offline_results.index + 1
-        offline_results.fillna(0, inplace=True)
+        offline_results = offline_results.fillna(0)
         off_X, off_S, off_P = offline_results['X'], offline_results['S'], offline_results['P']
-        off_dict = {'X': [], 'S': [], 'P': []}
-        for i in range(0, self.var_Params['duration']):
-            if i in offline_results.index.to_list():
-                off_dict['X'].append(off_X[i])
-                off_dict['S'].append(off_S[i])
-                off_dict['P'].append(off_P[i])
-            else:
-                off_dict['X'].append(np.nan)
-                off_dict['S'].append(np.nan)
-                off_dict['P'].append(np.nan)
-        off_df = pd.DataFrame(off_dict)
-        off_df.interpolate(inplace=True)
-        rmse = sklearn.metrics.mean_squared_error([X, S, P], [off_df['X'], off_df['S'], off_df['P']], squared=False)
+        rmse = score_offline_sets(self.Results, [offline_results], duration=self.var_Params['duration'])['hourly'][0]
+        if not show:
+            render_results(time, self.Results, offline_results, offline_time=off_time, offline_linestyle='--',
+                           title=f'RMSE of linear fit: {round(rmse, 3)}', filename=figure_path)
+            return rmse
+        import matplotlib.pyplot as plt
 
+        plt.plot(time, X, 'r', time, S, 'g', time, P, 'b')
         plt.plot(off_time, off_X, 'r', off_time, off_S, 'g', off_time, off_P, 'b', linestyle='--', marker='X')
 
         plt.legend(['Biomass [g/L]', 'Substrate [g/L]', 'Product [g/L]'])
@@ -484,6 +1951,8 @@ class MonodModel:
         return rmse
 
     def get_max_biomass(self):
+        import sklearn.metrics
+
         if not hasattr(self, 'Results'):
             self.calculate_monod()
 
@@ -495,3 +1964,203 @@ class MonodModel:
         print(f'Absolute error of current and desired biomass: {round(mae_X, 3)}')
 
         return max_X
+
+
+class MonodStepper:
+    '''
+    The 'MonodStepper' class holds the current state of a running fermentation and advances it step by step,
+    e.g. for soft sensors or digital twins. Every step costs the same, independent of the process time. Measured
+    states and parameters can be changed between steps without replaying the history. In 'batch' mode with dt=1
+    the steps reproduce MonodModel.calculate_monod(). Raises AttributeError for unsupported modes of operation.
+        Attributes:
+            time: float, current process time [h]
+            state: dict, current X, S, P [g/L], V [L] and u [h^-1]
+    '''
+    __OperationModes = ('batch', 'fedbatch', 'continuous')
+
+    def __init__(self, params: dict, conditions: dict, mode: str = 'batch', feed: dict = None, dt: float = 1.0):
+        '''
+        :param params: dict, monod parameters umax, Ks, Yx, k1 and u0 as in MonodModel.var_Params
+        :param conditions: dict, starting conditions S0, X0, P0 as in MonodModel.var_Conditions
+        :param mode: str, 'batch', 'fedbatch' or 'continuous'
+        :param feed: dict, V0 [L], F [L/h] or feed profile and Sf [g/L] as in MonodModel.var_Feed (not needed in
+            'batch' mode)
+        :param dt: float, step size [h]
+        '''
+        if mode not in self.__OperationModes:
+            raise AttributeError('Unsupported mode of operation. Check to see if mode is one of '
+                                 '"batch", "fedbatch", or "continuous".')
+        self.mode = mode
+        self.dt = dt
+        self.params = {key: params[key] for key in ['umax', 'Ks', 'Yx', 'k1']}
+        self.feed = dict(feed) if feed is not None else {'V0': 1.0, 'F': 0.0, 'Sf': 0.0}
+        self.time = 0.0
+        self.__X, self.__S, self.__P = (float(conditions[name]) for name in ('X0', 'S0', 'P0'))
+        self.__u = float(params['u0'])
+        self.__rX = self.__u * self.__X
+        self.__V = self.feed['V0']
+
+    @property
+    def state(self):
+        return {'X': float(self.__X), 'S': float(self.__S), 'P': float(self.__P), 'V': float(self.__V),
+                'u': float(self.__u)}
+
+    def step(self, k: int = 1):
+        '''
+        Advances the process by k steps of dt hours.
+        :param k: int, number of steps
+        :return: dict, state after the last step
+        '''
+        umax, Ks, Yx, k1 = self.params['umax'], self.params['Ks'], self.params['Yx'], self.params['k1']
+        for _ in range(k):
+            if self.mode == 'batch':
+                D, F = None, 0.0
+            elif self.mode == 'fedbatch':
+                F = self.feed_rate()
+                D = F / self.__V
+            else:
+                F = 0.0                                     # inflow equals outflow, the volume stays constant
+                D = self.feed_rate() / self.__V
+            self.__X, self.__S, self.__P, self.__u, self.__rX, _, _ = monod_step(
+                    self.__X, self.__S, self.__P, self.__u, self.__rX, umax, Ks, Yx, k1, D=D, Sf=self.feed['Sf'],
+                    dt=self.dt)
+            self.__V = self.__V + F * self.dt
+            self.time += self.dt
+        return self.state
+
+    def feed_rate(self):
+        '''
+        Returns the feed rate F [L/h] at the current process time, F may be constant or a feed profile, see
+        feed_schedule(). A switch counts from the step that starts at its time.
+        '''
+        times, rates = feed_schedule(self.feed['F'])
+        # tolerance for the round-off of self.time after many steps of non-integer dt
+        return float(rates[np.searchsorted(times, self.time + 1e-9 * self.dt, side='right') - 1])
+
+    def correct(self, X: float = None, S: float = None, P: float = None, V: float = None):
+        '''
+        Replaces the current state by measured values, e.g. from online sensors or offline samples.
+        '''
+        if X is not None:
+            self.__X = X
+        if S is not None:
+            self.__S = S
+        if P is not None:
+            self.__P = P
+        if V is not None:
+            self.__V = V
+
+    def set_params(self, **params):
+        '''
+        Changes monod parameters (umax, Ks, Yx, k1) or feed settings (F, Sf) for all following steps.
+        Raises KeyError for unknown parameters.
+        '''
+        for key, value in params.items():
+            if key in self.params:
+                self.params[key] = value
+            elif key in ['F', 'Sf']:
+                self.feed[key] = value
+            else:
+                raise KeyError(f'Unknown parameter "{key}".')
+
+
+class ResultArchive:
+    '''
+    The 'ResultArchive' class stores the results of many MonodModel runs in one binary file.
+    The results are kept in '<path>.npy' as a float array of shape (n_runs, len(variables), duration), which
+    is memory-mapped on loading. The model states are kept one line per run in '<path>.jsonl'. Runs are appended
+    in bulk without rewriting the existing data. An archive holds either batch runs (MONOD_VARIABLES) or fed-batch
+    and continuous runs, whose volume V is stored as an additional variable.
+        Attributes:
+            path: str, archive path without file extension
+    '''
+    # Fixed size of the .npy header, so the shape can be updated in place when appending
+    __HeaderSize = 128
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__states = None
+
+    def __len__(self):
+        if not os.path.isfile(f'{self.path}.npy'):
+            return 0
+        with open(f'{self.path}.npy', 'rb') as file:
+            return self.__read_shape(file)[0]
+
+    def __getitem__(self, index: int):
+        return MonodModel.from_archive(self, index)
+
+    @property
+    def variables(self):
+        '''
+        Names of the stored variables along axis 1 of results(), MONOD_VARIABLES and 'V' for fed-batch runs.
+        '''
+        with open(f'{self.path}.npy', 'rb') as file:
+            n_variables = self.__read_shape(file)[1]
+        return MONOD_VARIABLES + ('V', ) if n_variables > len(MONOD_VARIABLES) else MONOD_VARIABLES
+
+    def append(self, models: list):
+        '''
+        Appends the results and states of the models to the archive.
+        Raises AttributeError if a model has no results and ValueError if the durations or the operation modes (batch
+        or with volume V) do not match each other or the archive.
+        :param models: list, MonodModel instances with results
+        :return: range, indices of the appended models
+        '''
+        if any(not hasattr(model, 'Results') for model in models):
+            raise AttributeError('No Results yet! Call Monod_Model.calculate_monod() before archiving.')
+        variables = {MONOD_VARIABLES + ('V', ) if 'V' in model.Results else MONOD_VARIABLES for model in models}
+        if len(variables) > 1:
+            raise ValueError('Batch results and results with a volume V cannot be archived together.')
+        names = variables.pop()
+        data = np.array([[model.Results[name] for name in names] for model in models], dtype='<f8')
+
+        mode = 'r+b' if os.path.isfile(f'{self.path}.npy') else 'w+b'
+        with open(f'{self.path}.npy', mode) as file:
+            if mode == 'r+b':
+                shape = self.__read_shape(file)
+            else:
+                shape = (0, ) + data.shape[1:]
+                self.__write_shape(file, shape)
+            if data.shape[1:] != shape[1:]:
+                raise ValueError(f'Results of shape {data.shape[1:]} do not match the archive shape {shape[1:]}.')
+            file.seek(0, os.SEEK_END)
+            file.write(data.tobytes())
+            self.__write_shape(file, (shape[0] + len(data), ) + shape[1:])
+
+        with open(f'{self.path}.jsonl', 'a') as file:
+            for model in models:
+                file.write(json.dumps(model.get_state()) + '\n')
+        self.__states = None
+        return range(shape[0], shape[0] + len(data))
+
+    def results(self, index=None):
+        '''
+        Returns the memory-mapped results, of all runs or of the run(s) at index.
+        :param index: int, slice or None
+        :return: np.memmap, shape (len(variables), duration) for a single run
+        '''
+        data = np.load(f'{self.path}.npy', mmap_mode='r')
+        return data if index is None else data[index]
+
+    def state(self, index: int):
+        '''
+        Returns the serialized model state of the run at index.
+        :param index: int
+        :return: dict
+        '''
+        if self.__states is None:
+            with open(f'{self.path}.jsonl', 'r') as file:
+                self.__states = file.readlines()
+        return json.loads(self.__states[index])
+
+    def __read_shape(self, file):
+        file.seek(0)
+        np.lib.format.read_magic(file)
+        return np.lib.format.read_array_header_1_0(file)[0]
+
+    def __write_shape(self, file, shape: tuple):
+        header = repr({'descr': '<f8', 'fortran_order': False, 'shape': tuple(shape)})
+        header = header.ljust(self.__HeaderSize - 11) + '\n'
+        file.seek(0)
+        file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
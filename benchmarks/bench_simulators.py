@@ -0,0 +1,263 @@
+"""
+Benchmark suite for the fermentation (FermProSimFun) and data-prep (DatPrep_Modul) simulators.
+
+Every operation is run for a set of problem sizes: the process duration [h], the ensemble size or the number of
+datasets, depending on the operation. Wall time (best and median of several repeats) and peak memory (traced by
+tracemalloc in a separate run) are reported per operation and size. All random numbers are seeded, so runs of
+different versions do the same work. No display is needed.
+
+Usage:
+    python benchmarks/bench_simulators.py                                   # all operations, sizes 20, 1000, 100000
+    python benchmarks/bench_simulators.py --sizes 20 1000 --ops ferm.calc_rmse datprep.datensatz
+    python benchmarks/bench_simulators.py --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Resources'))
+sys.path.insert(0, os.path.join(ROOT, 'Notebooks', 'DatPrepSim'))
+
+import numpy as np  # noqa: E402
+
+import DatPrep_Modul  # noqa: E402
+import FermProSimFun  # noqa: E402
+
+SEED = 201623945
+SIZES = (20, 1000, 100_000)
+
+
+def seed_all(seed: int = SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def ferm_model(duration: int = 24) -> FermProSimFun.MonodModel:
+    seed_all()
+    model = FermProSimFun.MonodModel()
+    model.var_Params['duration'] = duration
+    return model
+
+
+def datprep_model(duration: int = 24) -> DatPrep_Modul.MonodModel:
+    seed_all()
+    model = DatPrep_Modul.MonodModel(add_errors=False, apply_noise=True, apply_outliers=True,
+                                     apply_missing_values=True)
+    model._MonodModel__Params['duration'] = duration
+    return model
+
+
+# Each benchmark takes the size and returns (what the size means, setup, run). setup() is not timed and its return
+# value is passed to run().
+def bench_calculate_monod(size):
+    return 'duration', lambda: ferm_model(size), lambda model: model.calculate_monod()
+
+
+def bench_calculate_monod_ensemble(size):
+    def setup():
+        seed_all()
+        rng = np.random.default_rng(SEED)
+        low, high = FermProSimFun.FIT_BOUNDS
+        params = rng.uniform(low, high, size=(size, 4)).T
+        return params, rng.uniform(19, 21, size), rng.uniform(0.05, 0.3, size)
+
+    def run(args):
+        (umax, Ks, Yx, k1), S0, X0 = args
+        return FermProSimFun.calculate_monod_ensemble(umax, Ks, Yx, k1, S0, X0)
+
+    return 'ensemble size', setup, run
+
+
+def bench_calc_rmse(size):
+    def setup():
+        model = ferm_model(size)
+        model.get_reference_results()
+        return model
+
+    return 'duration', setup, lambda model: model.calc_rmse([0.8, 8.5, 0.5, 0.1])
+
+
+def bench_fit_model(size):
+    return 'duration', lambda: ferm_model(size), lambda model: model.fit_model([0.8, 8.5, 0.5, 0.1], verbose=False)
+
+
+def bench_to_json(size):
+    def setup():
+        model = ferm_model(size)
+        model.calculate_monod()
+        return model
+
+    return 'duration', setup, lambda model: model.to_json()
+
+
+def bench_datensatz(size):
+    def run(_):
+        return DatPrep_Modul.Datensatz(n_datasets=size, random_seed=SEED, generate_custom_datasets=True,
+                                       generate_defaults=False)
+
+    return 'n_datasets', lambda: None, run
+
+
+def bench_datensatz_arrays(size):
+    def run(_):
+        return DatPrep_Modul.Datensatz(n_datasets=size, random_seed=SEED, generate_custom_datasets=True,
+                                       generate_defaults=False, array_backed=True)
+
+    return 'n_datasets', lambda: None, run
+
+
+def bench_add_random_errors(size):
+    def setup():
+        model = datprep_model(size)
+        model.calculate_monod()
+        return model
+
+    return 'duration', setup, lambda model: model.add_random_errors()
+
+
+def bench_add_random_errors_batch(size):
+    def setup():
+        rng = np.random.default_rng(SEED)
+        params = DatPrep_Modul.draw_parameter_table(size, rng)
+        data = DatPrep_Modul.calculate_monod_batch(*(params[name] for name in DatPrep_Modul.BATCH_FIT_PARAMETERS))
+        return data, rng
+
+    return 'curves', setup, lambda args: DatPrep_Modul.add_random_errors_batch(args[0], rng=args[1], copy=False)
+
+
+# Largest size run by default, bigger sizes are skipped unless --no-limit is given
+MAX_SIZES = {
+    'ferm.fit_model': 200,          # hundreds of model evaluations per fit, warm-up and tracing run each of them
+}
+
+BENCHMARKS = {
+    'ferm.calculate_monod': bench_calculate_monod,
+    'ferm.calculate_monod_ensemble': bench_calculate_monod_ensemble,
+    'ferm.calc_rmse': bench_calc_rmse,
+    'ferm.fit_model': bench_fit_model,
+    'ferm.to_json': bench_to_json,
+    'datprep.datensatz': bench_datensatz,
+    'datprep.datensatz_arrays': bench_datensatz_arrays,
+    'datprep.add_random_errors': bench_add_random_errors,
+    'datprep.add_random_errors_batch': bench_add_random_errors_batch,
+}
+
+
+def warm_up(name: str, size: int):
+    """
+    Runs a benchmark once untimed, so that lazily imported dependencies (scipy, sklearn) are not part of the timing.
+    """
+    unit, setup, run = BENCHMARKS[name](size)
+    run(setup())
+
+
+def measure(name: str, size: int, repeat: int = 5, min_time: float = 1.0) -> dict:
+    """
+    Times one benchmark and traces its peak memory.
+    Repeats stop early once min_time [s] has been spent, so slow operations at large sizes run only once.
+    :param name: str, key of BENCHMARKS
+    :param size: int, problem size
+    :param repeat: int, maximum number of timed runs
+    :param min_time: float, time budget [s] after which no further repeats are started
+    :return: dict with best and median wall time [s], peak traced memory [bytes] and the number of repeats
+    """
+    unit, setup, run = BENCHMARKS[name](size)
+    times = []
+    while len(times) < repeat and sum(times) < min_time:
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'operation': name, 'size': size, 'unit': unit, 'best': min(times), 'median': statistics.median(times),
+            'repeats': len(times), 'peak_memory': peak}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'date': datetime.now().isoformat(timespec='seconds'), 'commit': commit, 'seed': SEED,
+            'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()}
+
+
+def compare(results: list, baseline_path: str):
+    """
+    Prints the ratio of the best times and peak memory to a previous JSON report, > 1 means slower or larger.
+    """
+    with open(baseline_path) as file:
+        baseline = {(row['operation'], row['size']): row for row in json.load(file)['results']}
+    print(f'\nCompared to {baseline_path}:')
+    for row in results:
+        old = baseline.get((row['operation'], row['size']))
+        if old is None:
+            continue
+        print(f"{row['operation']:<32} {row['size']:>8}  time x{row['best'] / old['best']:6.2f}  "
+              f"memory x{row['peak_memory'] / max(old['peak_memory'], 1):6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS),
+                        help='operations to benchmark')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES), help='problem sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='maximum number of timed runs')
+    parser.add_argument('--min-time', type=float, default=1.0, help='stop repeating after this many seconds')
+    parser.add_argument('--no-limit', action='store_true', help=f'ignore the size limits {MAX_SIZES}')
+    parser.add_argument('--output', default=None, help='JSON report, default: benchmarks/results/<date>.json')
+    parser.add_argument('--compare', default=None, help='JSON report of a previous run to compare against')
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    results = []
+    # to_json() writes into the working directory, the directory and its files are removed afterwards
+    with tempfile.TemporaryDirectory(prefix='biolabsim_bench_') as workdir:
+        os.chdir(workdir)
+        try:
+            print(f"{'operation':<32} {'size':>8}  {'best [s]':>10} {'median [s]':>10}  {'peak [MB]':>9}")
+            for name in args.ops:
+                warm_up(name, min(args.sizes))
+                for size in args.sizes:
+                    if not args.no_limit and size > MAX_SIZES.get(name, size):
+                        print(f'{name:<32} {size:>8}  skipped (above {MAX_SIZES[name]}, use --no-limit)')
+                        continue
+                    row = measure(name, size, args.repeat, args.min_time)
+                    results.append(row)
+                    print(f"{name:<32} {size:>8}  {row['best']:10.4f} {row['median']:10.4f}  "
+                          f"{row['peak_memory'] / 2 ** 20:9.2f}", flush=True)
+        finally:
+            os.chdir(cwd)    # leave the directory before it is deleted
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({'environment': environment(), 'results': results}, file, indent=4)
+    print(f'Results saved to {output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
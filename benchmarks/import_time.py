@@ -0,0 +1,76 @@
+"""
+Cold-start import check for the simulator modules.
+
+Every module is imported in a fresh interpreter so nothing is cached between measurements. The check fails
+(exit code 1) if an import takes longer than its budget or if it drags in one of the heavy dependencies that
+should only be loaded by plotting, fitting or PCR code.
+
+Usage: python benchmarks/import_time.py [--repeat N] [--budget SECONDS]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module name -> directory that has to be on sys.path to import it
+MODULES = {
+    'FermProSimFun': os.path.join(ROOT, 'Resources'),
+    'DatPrep_Modul': os.path.join(ROOT, 'Notebooks', 'DatPrepSim'),
+    'BioCircuitSim_functions': os.path.join(ROOT, 'Notebooks'),
+}
+
+HEAVY_MODULES = ('matplotlib', 'pandas', 'scipy', 'sklearn', 'pydna')
+
+PROBE = '''
+import json, sys, time
+sys.path.insert(0, {path!r})
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure(module: str, path: str, repeat: int = 3) -> dict:
+    """
+    Imports a module in fresh interpreters and reports the fastest import time.
+    :param module: str, module name
+    :param path: str, directory that contains the module
+    :param repeat: int, number of fresh interpreters, the minimum is reported
+    :return: dict with the import time [s] and the heavy dependencies found in sys.modules afterwards
+    """
+    code = PROBE.format(path=path, module=module, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {'module': module,
+            'seconds': min(run['seconds'] for run in runs),
+            'loaded': sorted(set().union(*(run['loaded'] for run in runs)))}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per module')
+    parser.add_argument('--budget', type=float, default=0.5, help='maximum import time per module [s]')
+    args = parser.parse_args()
+
+    failed = False
+    for module, path in MODULES.items():
+        result = measure(module, path, args.repeat)
+        status = 'ok'
+        if result['loaded']:
+            status = f"loads {', '.join(result['loaded'])}"
+            failed = True
+        elif result['seconds'] > args.budget:
+            status = f'over budget ({args.budget:.2f} s)'
+            failed = True
+        print(f"{module:<25} {result['seconds'] * 1e3:8.1f} ms  {status}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
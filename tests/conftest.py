@@ -0,0 +1,11 @@
+"""
+The simulator modules are not installed as packages, they are imported from their folders like in the notebooks.
+"""
+import os
+import sys
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Resources'))
+sys.path.insert(0, os.path.join(ROOT, 'Notebooks', 'DatPrepSim'))
@@ -0,0 +1,249 @@
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import DatPrep_Modul
+from DatPrep_Modul import (BATCH_FIT_BOUNDS, BATCH_FIT_PARAMETERS, DURATION, MASK_KINDS, Datensatz, MonodModel,
+                           MonodView, add_random_errors_batch, calculate_monod_batch, draw_parameter_table,
+                           export_dataset, fit_monod_batch, iter_dataset_chunks, load_manifest, load_shard)
+
+ERROR_DISTRIBUTION = {'none': 40, 'noise': 20, 'outliers': 20, 'missing': 20}
+
+
+def curves(n, seed, **errors):
+    rng = np.random.default_rng(seed)
+    params = draw_parameter_table(n, rng)
+    true = np.array(params[list(BATCH_FIT_PARAMETERS)].tolist())
+    data, _ = add_random_errors_batch(calculate_monod_batch(*true.T)[:, :3], rng=rng,
+                                      **dict(dict(noise=False, outliers=False, missing=False), **errors))
+    return true, data
+
+
+def test_default_datasets_are_independent():
+    dataset = Datensatz(n_datasets=4, random_seed=42, generate_custom_datasets=False, generate_defaults=True,
+                        cache_dir=None)
+    umax = [[model.get_params()['umax'] for model in getattr(dataset, f'default_dataset_{number}').models[:4]]
+            for number in (1, 2, 3)]
+    assert umax[0] != umax[1] and umax[0] != umax[2] and umax[1] != umax[2]
+
+
+def test_custom_datasets_differ_from_default_dataset_1():
+    dataset = Datensatz(n_datasets=4, random_seed=42, generate_custom_datasets=True, generate_defaults=True,
+                        cache_dir=None)
+    assert ([model.get_params() for model in dataset.models]
+            != [model.get_params() for model in dataset.default_dataset_1.models])
+
+
+def test_cache_is_opt_in():
+    environment = {name: value for name, value in os.environ.items() if name != 'BIOLABSIM_CACHE'}
+    code = 'import DatPrep_Modul; print(DatPrep_Modul.Datensatz(random_seed=1, generate_defaults=False).cache_dir)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(DatPrep_Modul.__file__), env=environment,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'None'
+
+
+def test_cache_key_follows_seed_and_version(tmp_path, monkeypatch):
+    def cached_umax(random_seed):
+        dataset = Datensatz(random_seed=random_seed, cache_dir=str(tmp_path))
+        return [model.get_params()['umax'] for model in dataset.default_dataset_1.models]
+
+    first = cached_umax(1)
+    assert cached_umax(2) != first
+    assert len(os.listdir(tmp_path)) == 2
+    monkeypatch.setattr('DatPrep_Modul.CACHE_VERSION', DatPrep_Modul.CACHE_VERSION + 1)
+    assert cached_umax(1) == first
+    assert len(os.listdir(tmp_path)) == 3
+
+    def fail(task):
+        raise AssertionError('the cached dataset was generated again')
+
+    monkeypatch.setattr('DatPrep_Modul._generate_model', fail)
+    assert cached_umax(1) == first and len(os.listdir(tmp_path)) == 3
+
+
+@pytest.mark.parametrize('n_workers', [2, 3])
+def test_models_independent_of_workers(n_workers):
+    serial, parallel = (Datensatz(n_datasets=12, random_seed=7, generate_custom_datasets=True, cache_dir=None,
+                                  n_workers=workers)
+                        for workers in (1, n_workers))
+    assert len(serial.models) == 12
+    assert [model.get_params() for model in serial.models] == [model.get_params() for model in parallel.models]
+    for expected, result in zip(serial.results, parallel.results):
+        pd.testing.assert_frame_equal(pd.DataFrame(expected), pd.DataFrame(result))
+
+
+@pytest.mark.parametrize('n_workers', [2, 3])
+def test_arrays_independent_of_workers(n_workers, monkeypatch):
+    monkeypatch.setattr('DatPrep_Modul.ARRAY_BLOCK_SIZE', 16)  # several blocks without generating thousands of curves
+    serial, parallel = (Datensatz(n_datasets=50, random_seed=7, generate_custom_datasets=True, array_backed=True,
+                                  cache_dir=None, n_workers=workers)
+                        for workers in (1, n_workers))
+    assert serial.data.shape[0] == 50
+    np.testing.assert_array_equal(serial.params, parallel.params)
+    np.testing.assert_array_equal(serial.data, parallel.data)  # NaN of missing values compare equal
+    for kind in ('noise', 'outliers', 'missing'):
+        np.testing.assert_array_equal(serial.masks[kind], parallel.masks[kind])
+
+
+def test_array_backed_curves_follow_their_parameters():
+    dataset = Datensatz(n_datasets=30, random_seed=5, generate_custom_datasets=True, array_backed=True, cache_dir=None)
+    assert dataset.data.shape == (30, 4, DURATION) and len(dataset) == 30 and dataset.models == []
+    clean = calculate_monod_batch(*(dataset.params[name] for name in BATCH_FIT_PARAMETERS))
+    corrupted = dataset.masks['noise'] | dataset.masks['outliers'] | dataset.masks['missing']
+    np.testing.assert_array_equal(dataset.data[~corrupted], clean[~corrupted])
+    assert np.isnan(dataset.data[dataset.masks['missing']]).all()
+    for kind, flag in (('noise', 'apply_noise'), ('outliers', 'apply_outliers'), ('missing', 'apply_missing_values')):
+        np.testing.assert_array_equal(dataset.masks[kind].any(axis=(1, 2)), dataset.params[flag])
+
+
+def test_array_backed_views():
+    dataset = Datensatz(n_datasets=10, random_seed=5, generate_custom_datasets=True, array_backed=True, cache_dir=None)
+    view = dataset[3]
+    assert isinstance(view, MonodView) and np.shares_memory(view.Results['X'], dataset.data)
+    assert list(view.Results) == ['X', 'S', 'P', 'u']
+    np.testing.assert_array_equal(view.Results['S'], dataset.data[3, 1])
+    assert view.get_params() == {name: float(dataset.params[3][name]) for name in BATCH_FIT_PARAMETERS}
+    assert view.add_errors == (view.apply_noise or view.apply_outliers or view.apply_missing_values)
+    with pytest.raises(IndexError):
+        dataset[10]
+
+
+def test_empty_array_backed_dataset_has_the_model_duration():
+    dataset = Datensatz(n_datasets=0, random_seed=5, generate_custom_datasets=True, array_backed=True, cache_dir=None)
+    assert len(dataset) == 0 and len(dataset.params) == 0
+    assert dataset.data.shape == (0, 4, len(MonodModel().calculate_monod()['X'])) == (0, 4, DURATION)
+    assert {kind: mask.shape for kind, mask in dataset.masks.items()} == {kind: (0, 4, DURATION) for kind in MASK_KINDS}
+
+
+def test_empty_export_records_the_duration(tmp_path):
+    manifest = export_dataset(str(tmp_path), 0, 3, ERROR_DISTRIBUTION)
+    assert (manifest['duration'], manifest['shards']) == (DURATION, [])
+
+
+@pytest.mark.parametrize('n_workers', [1, 2, 3])
+def test_imap_bounded_keeps_order_and_bound(n_workers):
+    pulled = []
+
+    def tasks():
+        for task in range(20):
+            pulled.append(task)
+            yield task
+
+    results = DatPrep_Modul._imap_bounded(math.factorial, tasks(), n_workers)
+    assert next(results) == 1
+    assert len(pulled) <= 2 * n_workers  # the tasks are consumed lazily
+    assert [1] + list(results) == [math.factorial(task) for task in range(20)]
+
+
+def test_chunks_independent_of_workers():
+    # 9 chunks, more than the 2 * n_workers chunks in flight, so the bounded window has to move on
+    serial, parallel = (list(iter_dataset_chunks(70, 3, ERROR_DISTRIBUTION, chunk_size=8, n_workers=workers))
+                        for workers in (1, 3))
+    assert [offset for offset, _, _, _ in serial] == list(range(0, 70, 8))
+    for (offset, params, data, masks), (parallel_offset, *parallel_chunk) in zip(serial, parallel):
+        assert offset == parallel_offset
+        np.testing.assert_array_equal(params, parallel_chunk[0])
+        np.testing.assert_array_equal(data, parallel_chunk[1])
+        for kind in MASK_KINDS:
+            np.testing.assert_array_equal(masks[kind], parallel_chunk[2][kind])
+
+
+def test_errors_per_curve_stream_match_across_chunk_boundaries():
+    rng = np.random.default_rng(6)
+    params = draw_parameter_table(30, rng)
+    clean = calculate_monod_batch(*(params[name] for name in BATCH_FIT_PARAMETERS))
+    streams = np.random.SeedSequence(6).spawn(len(clean))
+    flags = dict(noise=rng.random(30) < 0.5, outliers=rng.random(30) < 0.5, missing=rng.random(30) < 0.5)
+    serial, serial_masks = add_random_errors_batch(clean, rng=[np.random.default_rng(s) for s in streams], **flags)
+    for start, stop in ((0, 7), (7, 8), (8, 30)):
+        chunk, chunk_masks = add_random_errors_batch(
+            clean[start:stop], rng=[np.random.default_rng(s) for s in streams[start:stop]],
+            **{kind: flag[start:stop] for kind, flag in flags.items()})
+        np.testing.assert_array_equal(chunk, serial[start:stop])
+        for kind in MASK_KINDS:
+            np.testing.assert_array_equal(chunk_masks[kind], serial_masks[kind][start:stop])
+
+
+def test_export_round_trip(tmp_path):
+    manifest = export_dataset(str(tmp_path), 45, 3, ERROR_DISTRIBUTION, chunk_size=20)
+    assert load_manifest(str(tmp_path)) == manifest
+    assert (manifest['random_seed'], manifest['error_distribution'], manifest['n_curves']) == (3, ERROR_DISTRIBUTION, 45)
+    assert [(shard['offset'], shard['n_curves']) for shard in manifest['shards']] == [(0, 20), (20, 20), (40, 5)]
+
+    chunks = list(iter_dataset_chunks(45, 3, ERROR_DISTRIBUTION, chunk_size=20))
+    for shard, (offset, params, data, masks) in zip(manifest['shards'], chunks):
+        shard_params, shard_data, shard_masks = load_shard(str(tmp_path), shard['index'])
+        assert isinstance(shard_data, np.memmap) and shard['offset'] == offset
+        np.testing.assert_array_equal(shard_params, params)
+        np.testing.assert_array_equal(shard_data, data)
+        for kind in MASK_KINDS:
+            np.testing.assert_array_equal(shard_masks[kind], masks[kind])
+
+
+def test_export_independent_of_workers(tmp_path):
+    export_dataset(str(tmp_path / 'serial'), 45, 3, ERROR_DISTRIBUTION, chunk_size=20)
+    manifest = export_dataset(str(tmp_path / 'parallel'), 45, 3, ERROR_DISTRIBUTION, chunk_size=20, n_workers=3)
+    for shard in manifest['shards']:
+        for expected, result in zip(load_shard(str(tmp_path / 'serial'), shard['index'], mmap_mode=None),
+                                    load_shard(str(tmp_path / 'parallel'), shard['index'], mmap_mode=None)):
+            if isinstance(expected, dict):
+                for kind in MASK_KINDS:
+                    np.testing.assert_array_equal(expected[kind], result[kind])
+            else:
+                np.testing.assert_array_equal(expected, result)
+
+
+def test_batch_fit_recovers_exact_curves():
+    true, data = curves(40, 0, missing=True)
+    fit = fit_monod_batch(data)
+    assert np.all(fit['converged'])
+    np.testing.assert_allclose(fit['params'], true, rtol=1e-4)
+
+
+def test_batch_fit_matches_least_squares():
+    from scipy.optimize import least_squares
+
+    true, data = curves(20, 1, noise=True)
+    fit = fit_monod_batch(data)
+    assert np.all(fit['converged'])
+    scale = np.nanmean(np.abs(data), axis=(0, 2))[:, None]
+    low, high = map(np.array, BATCH_FIT_BOUNDS)
+    references = []
+    for i in range(len(data)):
+        def residuals(theta):
+            return (calculate_monod_batch(*theta)[0, :3] - data[i]).ravel() / np.repeat(scale[:, 0], data.shape[2])
+
+        references.append(least_squares(residuals, (low + high) / 2, bounds=(low, high), loss='soft_l1',
+                                        f_scale=0.05, x_scale='jac'))
+    np.testing.assert_array_less(fit['cost'], [reference.cost * 1.01 for reference in references])
+    # the noise leaves a flat valley of umax and Ks, both fits are equally far from the true parameters
+    error = np.median(np.abs(fit['params'] - true) / true, axis=0)
+    reference_error = np.median(np.abs([reference.x for reference in references] - true) / true, axis=0)
+    np.testing.assert_array_less(error, reference_error * 1.1 + 1e-3)
+
+
+def test_batch_fit_is_robust_to_outliers():
+    true, data = curves(40, 2, outliers=True)
+    robust, linear = (np.median(np.abs(fit_monod_batch(data, loss=loss)['params'] - true) / true, axis=0)
+                      for loss in ('soft_l1', 'linear'))
+    np.testing.assert_array_less(robust, linear / 3)
+
+
+def test_fit_models_reports_failed_fits():
+    dataset = Datensatz(n_datasets=30, random_seed=4, generate_custom_datasets=True, array_backed=True, cache_dir=None)
+    table = dataset.fit_models()
+    assert table['converged'].all()
+    with pytest.warns(UserWarning, match='of 30 fits did not converge'):
+        assert not dataset.fit_models(max_iter=1)['converged'].all()
+
+
+def test_batch_fit_names_differ_from_fermprosimfun():
+    import FermProSimFun
+
+    assert DatPrep_Modul.BATCH_FIT_PARAMETERS[:4] == FermProSimFun.FIT_PARAMETERS
+    assert not hasattr(DatPrep_Modul, 'FIT_PARAMETERS') and not hasattr(DatPrep_Modul, 'FIT_BOUNDS')
@@ -0,0 +1,479 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import FermProSimFun
+from FermProSimFun import MonodModel, calculate_monod_ensemble, score_offline_sets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scalar_monod(umax, Ks, Yx, k1, S0, X0, P0=0, duration=24, u0=0):
+    """
+    The hourly per-model loop that calculate_monod() used before the ensemble engine, as reference.
+    """
+    X, S, P, u = [X0], [S0], [P0], [u0]
+    rX, rS, rP = [u0 * X0], [-(u0 * X0 / (Yx / S0))], [k1 * u0 * X0]
+    for j in range(1, duration):
+        u.append(max(umax * S[j - 1] / (Ks + S[j - 1]), 0))
+        rX.append(max(u[j - 1] * X[j - 1], 0))
+        X.append(X[j - 1] + rX[j])
+        rS.append(min(-(rX[j - 1] / Yx), 0))
+        S.append(max(S[j - 1] + rS[j], 0))
+        rP.append(max((k1 * u[j]) * X[j], 0))
+        P.append(P[j - 1] + rP[j])
+    return {'X': X, 'S': S, 'P': P, 'u': u, 'rX': rX, 'rS': rS, 'rP': rP}
+
+
+def test_ensemble_equals_scalar_loop():
+    rng = np.random.default_rng(1)
+    low, high = FermProSimFun.FIT_BOUNDS
+    params = rng.uniform(low, high, size=(50, 4))
+    S0, X0 = rng.uniform(19, 21, 50), rng.uniform(0.05, 0.3, 50)
+    ensemble = calculate_monod_ensemble(*params.T, S0, X0, duration=30)
+
+    for i in range(50):
+        reference = scalar_monod(*params[i], S0[i], X0[i], duration=30)
+        for v, name in enumerate(FermProSimFun.MONOD_VARIABLES):
+            np.testing.assert_array_equal(ensemble[i, v], reference[name])
+
+
+def test_calculate_monod_equals_scalar_loop():
+    model = MonodModel()
+    params, conditions = model.var_Params, model.var_Conditions
+    result = model.calculate_monod()
+    reference = scalar_monod(params['umax'], params['Ks'], params['Yx'], params['k1'], conditions['S0'],
+                             conditions['X0'], conditions['P0'], params['duration'], params['u0'])
+    for name in FermProSimFun.MONOD_VARIABLES:
+        assert result[name] == reference[name]
+
+
+def test_single_run_equals_ensemble():
+    rng = np.random.default_rng(2)
+    low, high = FermProSimFun.FIT_BOUNDS
+    params = rng.uniform(low, high, size=(5, 4))
+    S0, X0 = rng.uniform(19, 21, 5), rng.uniform(0.05, 0.3, 5)
+    ensemble = calculate_monod_ensemble(*params.T, S0, X0, duration=200)
+
+    for i in range(5):
+        run = FermProSimFun.calculate_monod_run(*params[i], S0[i], X0[i], duration=200)
+        np.testing.assert_array_equal(np.array(run), ensemble[i])
+        np.testing.assert_array_equal(calculate_monod_ensemble(*params[i], S0[i], X0[i], duration=200)[0],
+                                      ensemble[i])
+        state = (X0[i], S0[i], 0.0, 0.0, 0.0)
+        for j in range(1, 200):
+            state = FermProSimFun.monod_step(*(float(value) for value in state[:5]), *params[i])
+            assert isinstance(state[0], float)
+            np.testing.assert_array_equal(state, ensemble[i, :, j])
+
+
+def test_sensitivities_match_finite_differences():
+    params = np.array([[0.8, 8.5, 0.5, 0.1], [0.6, 9.5, 0.45, 0.15], [1.05, 7.2, 0.58, 0.06]])
+    S0, X0 = np.array([20.0, 19.5, 20.5]), np.array([0.1, 0.25, 0.06])
+    _, sensitivities = FermProSimFun.calculate_monod_sensitivities(*params.T, S0, X0, duration=24)
+
+    for p in range(len(FermProSimFun.FIT_PARAMETERS)):
+        h = 1e-6 * params[:, p]
+        up, down = params.copy(), params.copy()
+        up[:, p] += h
+        down[:, p] -= h
+        difference = (calculate_monod_ensemble(*up.T, S0, X0)[:, :3]
+                      - calculate_monod_ensemble(*down.T, S0, X0)[:, :3]) / (2 * h[:, None, None])
+        np.testing.assert_allclose(sensitivities[:, :, p], difference, rtol=1e-4, atol=1e-6)
+
+
+def test_fisher_information_matches_finite_differences():
+    params, S0, X0, sigma = np.array([0.8, 8.5, 0.5, 0.1]), 20.0, 0.1, [0.1, 0.5, 0.05]
+    _, sensitivities = FermProSimFun.calculate_monod_sensitivities(*params, S0, X0)
+    h = 1e-6 * params
+    columns = [(calculate_monod_ensemble(*(params + step), S0, X0)[0, :3]
+                - calculate_monod_ensemble(*(params - step), S0, X0)[0, :3]) / (2 * h[p])
+               for p, step in enumerate(np.diag(h))]
+    schedule = [2, 5, 9, 14, 20]
+    jacobian = np.stack(columns, axis=-1)[:, schedule] / np.array(sigma)[:, None, None]  # (variable, time, parameter)
+    expected = np.einsum('vtp,vtq->pq', jacobian, jacobian)
+
+    information = FermProSimFun.fisher_information(sensitivities[0], schedule, sigma=sigma)
+    np.testing.assert_allclose(information, expected, rtol=1e-4, atol=1e-8 * np.abs(expected).max())
+    np.testing.assert_allclose(FermProSimFun.fisher_information(sensitivities[0], sigma=sigma)[schedule].sum(axis=0),
+                               information)
+
+
+def test_monod_jacobian_matches_finite_differences():
+    args = (0.8, 8.5, 0.5, 0.1)
+    for y in ([0.5, 12.0, 0.3], [3.0, 0.4, 1.2], [6.0, 0.01, 2.0]):
+        y = np.array(y)
+        h = 1e-4 * y
+        rhs = FermProSimFun.monod_rhs
+        columns = [(rhs(0, y + step, *args) - rhs(0, y - step, *args)) / (2 * h[i]) for i, step in enumerate(np.diag(h))]
+        np.testing.assert_allclose(FermProSimFun.monod_jacobian(0, y, *args), np.stack(columns, axis=1),
+                                   rtol=1e-5, atol=1e-9)
+
+
+def test_stepper_reproduces_batch_calculation():
+    model = MonodModel()
+    result = model.calculate_monod()
+    stepper = model.get_stepper()
+    states = [stepper.state] + [stepper.step() for _ in range(model.var_Params['duration'] - 1)]
+
+    for name in ('X', 'S', 'P', 'u'):
+        assert [state[name] for state in states] == result[name]
+    assert stepper.time == model.var_Params['duration'] - 1
+
+
+@pytest.mark.parametrize('mode', ['fedbatch', 'continuous'])
+@pytest.mark.parametrize('feed', [0.05, [(0, 0), (6, 0.1), (15, 0.02)]])
+def test_stepper_follows_fed_calculation(mode, feed):
+    model = MonodModel()
+    model.var_OperationMode = mode
+    model.var_Feed['F'] = feed
+    result = model.calculate_monod()
+    stepper = model.get_stepper(dt=0.01)
+    states = [stepper.state] + [stepper.step(100) for _ in range(model.var_Params['duration'] - 1)]
+
+    # the feed volume is integrated exactly, the concentrations to the accuracy of the small Euler steps
+    np.testing.assert_allclose([state['V'] for state in states], result['V'], rtol=1e-12)
+    for name in ('X', 'S', 'P'):
+        reference = np.array(result[name])
+        np.testing.assert_allclose([state[name] for state in states], reference,
+                                   atol=0.05 * np.abs(reference).max())
+
+
+def test_stepper_feed_profile():
+    model = MonodModel()
+    model.var_OperationMode = 'fedbatch'
+    model.var_Feed['F'] = [(2, 0.1), (4, 0.05)]
+    stepper = model.get_stepper(dt=0.5)
+    rates = []
+    for _ in range(12):
+        rates.append(stepper.feed_rate())
+        stepper.step()
+    assert rates == [0.0] * 4 + [0.1] * 4 + [0.05] * 4
+    assert stepper.state['V'] == pytest.approx(model.var_Feed['V0'] + 2 * 0.1 + 2 * 0.05)
+
+
+def test_unsupported_operation_mode():
+    model = MonodModel()
+    model.var_OperationMode = 'fed-batch'
+    with pytest.raises(AttributeError, match='Unsupported mode of operation'):
+        model.calculate_monod()
+    with pytest.raises(AttributeError, match='Unsupported mode of operation'):
+        model.simulate_feed_profiles([0.05])
+
+
+def test_headless_rendering_does_not_load_pyplot(tmp_path):
+    # pyplot may already be loaded by other tests, so the rendering runs in a fresh interpreter
+    code = f'''
+import os, sys
+sys.path.insert(0, {os.path.join(ROOT, 'Resources')!r})
+os.chdir({str(tmp_path)!r})
+import FermProSimFun
+model = FermProSimFun.MonodModel()
+model.calculate_monod()
+model.plot_results(show=False, filename='results.png')
+model.offline_samples(show=False, figure_path='samples.png')
+FermProSimFun.render_batch([model, model], 'batch', n_workers=1)
+print('matplotlib.pyplot' in sys.modules)
+'''
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == 'False'
+    assert sorted(os.listdir(tmp_path / 'batch')) == ['Results_0.png', 'Results_1.png']
+    assert (tmp_path / 'results.png').exists() and (tmp_path / 'samples.png').exists()
+
+
+def test_plot_linear_fit_keeps_its_rmse():
+    import sklearn.metrics
+
+    model = MonodModel()
+    model.calculate_monod()
+    offline = pd.DataFrame({'X': [0.2, np.nan, 1.5, 4.0], 'S': [20.0, 18.0, np.nan, 2.0], 'P': [0.0, 0.1, 0.5, 1.2]},
+                           index=[0, 4, 8, 20])
+    rmse = model.plot_linear_fit(offline, show=False)
+    assert offline.isna().sum().sum() == 2
+
+    # the metric of plot_linear_fit before score_offline_sets: missing samples as 0, per-hour RMSE averaged
+    grid = offline.fillna(0).reindex(range(model.var_Params['duration'])).interpolate()
+    X, S, P = model.Results['X'], model.Results['S'], model.Results['P']
+    expected = sklearn.metrics.mean_squared_error([X, S, P], [grid['X'], grid['S'], grid['P']], squared=False)
+    assert rmse == pytest.approx(expected, rel=1e-12)
+    assert rmse == score_offline_sets(model.Results, [offline.fillna(0)])['hourly'][0]
+
+
+@pytest.mark.parametrize('candidates', [None, [1, 3, 5, 8, 12, 16, 20, 23], [2, 6, 7, 11, 13, 17, 19, 22]])
+def test_d_optimal_exchange_matches_exhaustive(candidates):
+    _, sensitivities = FermProSimFun.calculate_monod_sensitivities(0.8, 8.5, 0.5, 0.1, 20, 0.1)
+    information = FermProSimFun.fisher_information(sensitivities[0])
+
+    exhaustive, exhaustive_value = FermProSimFun.d_optimal_schedule(information, 5, candidates, 'exhaustive')
+    exchange, exchange_value = FermProSimFun.d_optimal_schedule(information, 5, candidates, 'exchange')
+
+    allowed = range(len(information)) if candidates is None else candidates
+    assert set(exchange) <= set(allowed) and set(exhaustive) <= set(allowed)
+    for schedule, value in ((exhaustive, exhaustive_value), (exchange, exchange_value)):
+        assert value == pytest.approx(np.linalg.slogdet(FermProSimFun.fisher_information(sensitivities[0],
+                                                                                         schedule))[1])
+    assert exchange_value == pytest.approx(exhaustive_value)
+
+
+def test_d_optimal_exchange_starts_from_the_candidates():
+    # random rank-2 information per hour, an exchange search started from the wrong hours ends in a local optimum
+    rng = np.random.default_rng(11)
+    vectors = rng.normal(size=(24, 2, 4))
+    information = np.einsum('tap,taq->tpq', vectors, vectors)
+    candidates = sorted(rng.choice(24, 8, replace=False))
+
+    exhaustive = FermProSimFun.d_optimal_schedule(information, 4, candidates, 'exhaustive')
+    assert FermProSimFun.d_optimal_schedule(information, 4, candidates, 'exchange') == pytest.approx(exhaustive)
+
+
+def test_d_optimal_default_is_the_exchange_search(monkeypatch):
+    _, sensitivities = FermProSimFun.calculate_monod_sensitivities(0.8, 8.5, 0.5, 0.1, 20, 0.1)
+    information = FermProSimFun.fisher_information(sensitivities[0])
+    exhaustive = FermProSimFun.d_optimal_schedule(information, 7, method='exhaustive')
+
+    def exhaustive_schedule(information, k):
+        raise AssertionError('the default search must not enumerate all schedules')
+
+    monkeypatch.setattr(FermProSimFun, '_exhaustive_schedule', exhaustive_schedule)
+    assert FermProSimFun.d_optimal_schedule(information, 7) == pytest.approx(exhaustive)
+    assert FermProSimFun.d_optimal_schedule(information, 7, method='auto') == pytest.approx(exhaustive)
+
+
+@pytest.mark.parametrize('rmse, n_fits', [([0.1786, 0.0145, 0.0145 + 1e-6, 0.5], 3),
+                                          ([0.05, 0.05 + 5e-5, 0.01, 0.5], 2),
+                                          ([0.1786, 0.0145, 0.0012, 0.3], 4)])
+def test_multistart_stops_when_the_best_is_confirmed(monkeypatch, rmse, n_fits):
+    def fit_start(model, start_id, param_list, method, offline_values, weights):
+        optimum = dict(zip(FermProSimFun.FIT_PARAMETERS, param_list))
+        optimum.update({'rmse': rmse[start_id], 'success': True, 'nfev': 1, 'start': start_id, 'wall_time': 0.0})
+        return optimum
+
+    monkeypatch.setattr(FermProSimFun, '_fit_start', fit_start)
+    optima = MonodModel().fit_model_multistart(n_starts=4, n_workers=1, seed=5)
+    assert len(optima) == n_fits
+    assert optima.loc[0, 'rmse'] == min(rmse[:n_fits])
+
+
+def test_result_archive_round_trip(tmp_path):
+    archive = FermProSimFun.ResultArchive(str(tmp_path / 'runs'))
+    models = [MonodModel() for _ in range(5)]
+    for model in models:
+        model.calculate_monod()
+    assert list(archive.append(models[:2])) == [0, 1]
+    assert list(archive.append(models[2:])) == [2, 3, 4]
+
+    data = np.load(str(tmp_path / 'runs.npy'), mmap_mode='r')
+    assert isinstance(data, np.memmap) and data.shape == (5, len(FermProSimFun.MONOD_VARIABLES), 24)
+    with open(tmp_path / 'runs.jsonl') as file:
+        assert len(file.readlines()) == len(archive) == 5
+    for index, model in enumerate(models):
+        np.testing.assert_array_equal(data[index], [model.Results[name] for name in FermProSimFun.MONOD_VARIABLES])
+        loaded = archive[index]
+        assert loaded.var_Params == model.var_Params and loaded.var_Conditions == model.var_Conditions
+        assert loaded.Results == model.Results
+
+
+def test_result_archive_keeps_the_volume(tmp_path):
+    models = [MonodModel() for _ in range(2)]
+    for model in models:
+        model.var_OperationMode = 'fedbatch'
+        model.var_Feed['F'] = [(2, 0.1)]
+        model.calculate_monod()
+    archive = FermProSimFun.ResultArchive(str(tmp_path / 'fed'))
+    archive.append(models)
+    assert archive.variables[-1] == 'V'
+    assert archive[1].Results == pytest.approx(models[1].Results)
+    assert archive[1].Results['V'][-1] > archive[1].Results['V'][0]
+
+    batch = MonodModel()
+    batch.calculate_monod()
+    with pytest.raises(ValueError):
+        archive.append([batch])
+    with pytest.raises(ValueError):
+        FermProSimFun.ResultArchive(str(tmp_path / 'mixed')).append([batch, models[0]])
+
+
+def test_reference_cache_hits_misses_and_invalidation():
+    model = MonodModel()
+    first = model.get_reference_results()
+    assert model.get_reference_results() is first
+    assert (model.var_ReferenceCacheHits, model.var_ReferenceCacheMisses) == (1, 1)
+
+    model.calc_rmse([0.7, 8.0, 0.5, 0.1])  # fitted parameters do not change the hidden trajectory
+    assert model.get_reference_results() is first
+    assert (model.var_ReferenceCacheHits, model.var_ReferenceCacheMisses) == (3, 1)
+
+    model.set_conditions([15.0, 0.2], count=False)
+    changed = model.get_reference_results()
+    assert changed is not first and changed['S'][0] == 15.0
+    model.var_Conditions['X0'] = 0.25  # changed in place without set_conditions()
+    assert model.get_reference_results()['X'][0] == 0.25
+    model._MonodModel__hiddenParams['umax'] *= 1.1
+    expected = model.calculate_monod(hidden_params=True)
+    assert model.get_reference_results() == expected
+    assert (model.var_ReferenceCacheHits, model.var_ReferenceCacheMisses) == (3, 4)
+
+    model.var_Params['duration'] = 30
+    duration_30 = model.get_reference_results()
+    assert len(duration_30['X']) == 30
+
+    model.clear_reference_cache()
+    assert model.get_reference_results() is not duration_30
+    assert (model.var_ReferenceCacheHits, model.var_ReferenceCacheMisses) == (3, 6)
+
+
+def test_substrate_sweep_is_independent_of_workers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = MonodModel()
+    conditions = dict(model.var_Conditions)
+    values = [5, 10, 15, 20, 25, 30, 40]
+    table = model.run_substrate_sweep(values, 3, write_csv=False)
+    assert not os.path.exists('model_results')
+    assert model.var_Conditions == conditions
+    assert len(table) == len(values) * model.var_Params['duration']
+
+    for n_workers in (2, 3):
+        pd.testing.assert_frame_equal(model.run_substrate_sweep(values, 3, n_workers=n_workers, write_csv=False),
+                                      table)
+
+    model.var_Conditions['S0'] = 15
+    single = model.calculate_monod()
+    rows = table[table['S0'] == 15]
+    for name in ('X', 'S', 'P', 'u'):
+        assert rows[name].tolist() == single[name]
+
+    model.var_Conditions['S0'] = conditions['S0']
+    written = model.run_substrate_sweep(values, 3, n_workers=2)
+    files = os.listdir('model_results')
+    assert len(files) == 1 and files[0].startswith('SubstrateSweep_3_')
+    pd.testing.assert_frame_equal(pd.read_csv(os.path.join('model_results', files[0])), written, check_dtype=False)
+
+
+def test_sample_campaigns_shapes_seeding_and_npz(tmp_path):
+    model = MonodModel()
+    reference = model.get_reference_results()
+    truth = np.array([reference['X'], reference['S'], reference['P']]).T
+
+    times, samples = model.sample_campaigns(50, rng=np.random.default_rng(3))
+    assert times.shape == samples.shape[:2] and samples.shape[2] == 3 and len(samples) == 50
+    repeated = model.sample_campaigns(50, rng=np.random.default_rng(3))[1]
+    np.testing.assert_array_equal(samples, repeated)
+    assert not np.array_equal(samples, model.sample_campaigns(50, rng=np.random.default_rng(4))[1], equal_nan=True)
+
+    schedules = np.array([[0, 4, 8], [1, 2, 23]])
+    times, exact = model.sample_campaigns(2, schedules, noise=lambda values, rng: np.zeros_like(values))
+    np.testing.assert_array_equal(times, schedules)
+    np.testing.assert_array_equal(exact, truth[schedules])
+
+    filename = str(tmp_path / 'campaigns.npz')
+    times, samples = model.sample_campaigns(1000, [2, 6, 12], sigma=[0.1, 0.2, 0.05], rng=np.random.default_rng(5),
+                                            filename=filename)
+    with np.load(filename) as data:
+        np.testing.assert_array_equal(data['times'], times)
+        np.testing.assert_array_equal(data['samples'], samples)
+    residuals = samples - truth[[2, 6, 12]]
+    np.testing.assert_allclose(np.nanstd(residuals, axis=(0, 1)), [0.1, 0.2, 0.05], rtol=0.1)
+
+    with pytest.raises(ValueError):
+        model.sample_campaigns(2, [0.5, 3])
+    with pytest.raises(ValueError):
+        model.sample_campaigns(2, noise='uniform')
+
+
+@pytest.mark.parametrize('sampler', ['sobol', 'random'])
+def test_propagate_uncertainty_matches_np_quantile(sampler):
+    from scipy.stats import qmc
+
+    n, levels = 2 ** 13, (0.05, 0.25, 0.5, 0.9)
+    uq = FermProSimFun.propagate_uncertainty(n, sampler=sampler, seed=7, chunk_size=2 ** 11, bins=256,
+                                             quantiles=levels)
+
+    # the same samples in one piece
+    names = list(FermProSimFun.PARAM_PRIORS)
+    if sampler == 'sobol':
+        u = qmc.Sobol(d=len(names), seed=7).random(n)
+    else:
+        rng = np.random.default_rng(7)
+        u = np.concatenate([rng.random((2 ** 11, len(names))) for _ in range(4)])
+    low, high = np.array(list(FermProSimFun.PARAM_PRIORS.values())).T
+    data = calculate_monod_ensemble(*(low + (high - low) * u).T)[:, :3]
+
+    expected = np.quantile(data, levels, axis=0)
+    assert np.all(np.abs(uq['quantiles'] - expected) <= uq['resolution'] + 1e-12)
+    np.testing.assert_allclose(uq['mean'], data.mean(axis=0), rtol=1e-10, atol=1e-12)
+    np.testing.assert_allclose(uq['variance'], data.var(axis=0, ddof=1), rtol=1e-8, atol=1e-12)
+    np.testing.assert_array_equal(uq['min'], data.min(axis=0))
+    np.testing.assert_array_equal(uq['histogram'].sum(axis=-1), n)
+
+
+def posterior_model():
+    model = MonodModel()
+    hidden = model._MonodModel__hiddenParams
+    hidden.update(umax=0.8, Ks=8.5, Yx=0.5, k1=0.12)
+    model.set_conditions([20.0, 0.1], count=False)
+    reference = model.get_reference_results()
+    rng = np.random.default_rng(0)
+    hours = list(range(0, 24, 2))
+    offline = pd.DataFrame({name: np.array(reference[name])[hours] + rng.normal(0, 0.05, len(hours))
+                            for name in ('X', 'S', 'P')}, index=hours)
+    return model, offline, np.array([hidden[name] for name in FermProSimFun.FIT_PARAMETERS])
+
+
+def test_sample_posterior_is_independent_of_workers():
+    model, offline, _ = posterior_model()
+    kwargs = dict(n_walkers=8, n_steps=60, burn_in=10, n_chains=3, sigma=0.05, seed=1)
+    serial = model.sample_posterior(offline, n_workers=1, **kwargs)
+    parallel = model.sample_posterior(offline, n_workers=2, **kwargs)
+    assert serial['samples'].shape == (3, 50, 8, 4)
+    np.testing.assert_array_equal(serial['samples'], parallel['samples'])
+    np.testing.assert_array_equal(serial['log_prob'], parallel['log_prob'])
+    assert not np.array_equal(serial['samples'][0], serial['samples'][1])
+
+
+def test_sample_posterior_recovers_known_parameters():
+    model, offline, true = posterior_model()
+    result = model.sample_posterior(offline, n_walkers=16, n_steps=1500, burn_in=750, n_chains=1, n_workers=1,
+                                    sigma=0.05, param_list=[0.7, 9.0, 0.45, 0.1], seed=2)
+    summary = result['summary']
+    assert 0.1 < result['acceptance'][0] < 0.9
+    assert np.all((summary['2.5%'] <= true) & (true <= summary['97.5%']))
+    assert np.all(np.abs(summary['50%'] - true) <= [0.05, 0.1, 0.05, 0.05] * true)  # Ks is the least identified
+
+
+def condition_model():
+    model = MonodModel()
+    model.set_params([0.9, 8.0, 0.5, 0.1], count=False)
+    model.set_conditions([20.0, 0.1], count=False)
+    return model
+
+
+@pytest.mark.parametrize('method', ['cmaes', 'grid'])
+def test_optimize_conditions_finds_the_interior_optimum(method):
+    model = condition_model()
+    result = model.optimize_conditions(method=method, seed=0)
+    # more biomass than substrate can feed within 24 h does not pay off, the optimum X0 lies inside the bounds
+    assert result['converged'] and result['violation'] == 0
+    assert result['conditions']['S0'] == 50.0
+    assert result['conditions']['X0'] == pytest.approx(0.7103, abs=1e-3)
+    assert result['objective'] == pytest.approx(92.8174, abs=1e-3)
+    assert (model.var_Conditions['S0'], model.var_Conditions['X0']) == (20.0, 0.1)
+
+
+def test_optimize_conditions_methods_agree_with_brute_force():
+    model = condition_model()
+    S0, X0 = (grid.ravel() for grid in np.meshgrid(np.linspace(5, 50, 181), np.linspace(0.01, 1, 199)))
+    brute = calculate_monod_ensemble(0.9, 8.0, 0.5, 0.1, S0, X0)[:, 0, -1].max()
+    for method in ('cmaes', 'grid'):
+        assert model.optimize_conditions(method=method, seed=1)['objective'] >= brute - 1e-6
+
+
+def test_optimize_conditions_rejects_unknown_names():
+    model = condition_model()
+    with pytest.raises(ValueError):
+        model.optimize_conditions(objective='V')
+    with pytest.raises(ValueError):
+        model.optimize_conditions(bounds={'T': (20, 40)})